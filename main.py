@@ -1,20 +1,17 @@
 import os
 import sys
+import argparse
 import threading
 import time
 from datetime import datetime
-import tkinter as tk
-from tkinter import ttk, messagebox
 
 # Import modules
 from modules.config import Config
 from modules.logger import setup_logger
-from modules.record import AudioRecorder
+from modules.profiling import setup_profiling, summarize
 from modules.transcribe import Transcriber
-from modules.format import TextFormatter
-from modules.inject import TextInjector
-from modules.ui import VoiceAssistantUI
-from modules.hotkey import HotkeyManager
+from modules.format import create_formatter
+from modules.vocabulary import Vocabulary
 
 def resource_path(relative_path):
     """Get absolute path to resource, works for dev and for PyInstaller"""
@@ -30,21 +27,208 @@ def create_dirs():
     os.makedirs('.logs', exist_ok=True)
     os.makedirs('recordings', exist_ok=True)
 
+def run_server(host=None, port=None):
+    """Run the headless dictation server sharing one model"""
+    from modules.server import DictationServer
+    
+    create_dirs()
+    config = Config()
+    logger = setup_logger(config)
+    logger.info("Starting Voice-First Work Assistant server")
+    
+    config.start_watching()
+    if host:
+        config.set("server_host", host, persist=False)
+    if port:
+        config.set("server_port", port, persist=False)
+    
+    transcriber = Transcriber(config)
+    formatter = create_formatter(config)
+    vocabulary = Vocabulary(config)
+    
+    DictationServer(config, transcriber, formatter, vocabulary).run()
+
+def run_batch(audio_files):
+    """Transcribe audio files from the command line in batches"""
+    create_dirs()
+    config = Config()
+    setup_logger(config)
+    
+    transcriber = Transcriber(config)
+    vocabulary = Vocabulary(config)
+    batch_size = config.get("max_batch_size")
+    
+    for start in range(0, len(audio_files), batch_size):
+        batch = audio_files[start:start + batch_size]
+        for audio_file, (text, error) in zip(batch, transcriber.transcribe_batch(batch)):
+            if error:
+                print(f"{audio_file}: ERROR {error}")
+            else:
+                print(f"{audio_file}: {vocabulary.apply(text)}")
+
+def run_wake_benchmark(fixtures):
+    """Report wake phrase spotter CPU use and latency on recorded fixtures"""
+    from modules.wakeword import benchmark
+    
+    config = Config()
+    setup_logger(config)
+    
+    for result in benchmark(config, fixtures):
+        detections = ", ".join(f"{t:.2f}s" for t in result["detections"]) or "none"
+        print(f"{result['fixture']}: {result['duration']:.1f}s audio, "
+              f"{result['cpu_load']:.2%} of one core, detections at {detections}")
+        if result["closest_distance"] is not None:
+            print(f"  closest match distance {result['closest_distance']:.2f} "
+                  f"(threshold {config.get('wake_threshold')})")
+        if result["expected"]:
+            latencies = result["latencies"]
+            print(f"  detected {len(latencies)}/{result['expected']} wake phrases", end="")
+            if latencies:
+                print(f", latency mean {1000 * sum(latencies) / len(latencies):.0f} ms, "
+                      f"max {1000 * max(latencies):.0f} ms")
+            else:
+                print()
+
+def run_soak(args):
+    """Soak the recording pipeline and exit non-zero if resources grow past limits"""
+    # The fake formatter server accepts any key
+    os.environ.setdefault("GOOGLE_API_KEY", "soak-test")
+    
+    from modules.soak import SoakRunner
+    
+    create_dirs()
+    config = Config()
+    setup_logger(config)
+    
+    runner = SoakRunner(
+        config,
+        audio_path=args.soak_audio,
+        iterations=args.iterations,
+        rate_per_minute=args.rate,
+        max_in_flight=args.max_in_flight,
+        realtime=args.realtime,
+        format_latency_ms=args.format_latency_ms,
+        thresholds={
+            "rss_mb": args.max_rss_growth_mb,
+            "threads": args.max_thread_growth,
+            "open_files": args.max_open_files_growth,
+            "latency_drift": args.max_latency_drift
+        }
+    )
+    report = runner.run()
+    
+    print(f"Completed {report['completed']}/{report['iterations']} dictations, "
+          f"{report['format_requests']} formatting requests, errors: {report['errors'] or 'none'}")
+    for key, value in report["growth"].items():
+        print(f"  {key}: {report['baseline'][key]:.1f} -> {report['final'][key]:.1f} ({value:+.1f})")
+    if report["latency_drift"] is not None:
+        print(f"  latency drift: {report['latency_drift']:.2f}x")
+    
+    if not report["passed"]:
+        for failure in report["failures"]:
+            print(f"FAIL: {failure}")
+        sys.exit(1)
+    print("PASS")
+
+def run_resilience_check():
+    """Check formatting retries, hedging and fallback against a faulty fake server"""
+    # The fake formatter server accepts any key
+    os.environ.setdefault("GOOGLE_API_KEY", "resilience-check")
+    
+    from modules.fake_gemini import check_resilience
+    
+    create_dirs()
+    config = Config()
+    setup_logger(config)
+    
+    results = check_resilience(config)
+    for name, passed, detail in results:
+        print(f"{'PASS' if passed else 'FAIL'}: {name} ({detail})")
+    if not all(passed for _, passed, _ in results):
+        sys.exit(1)
+
 def main():
+    parser = argparse.ArgumentParser(description="Voice-First Work Assistant")
+    parser.add_argument("--server", action="store_true", help="Run the headless dictation server")
+    parser.add_argument("--host", help="Server host (default from config)")
+    parser.add_argument("--port", type=int, help="Server port (default from config)")
+    parser.add_argument("--transcribe", nargs="+", metavar="FILE", help="Transcribe audio files and exit")
+    parser.add_argument("--benchmark-wake", nargs="+", metavar="FILE",
+                        help="Benchmark the wake phrase spotter on recorded audio and exit")
+    parser.add_argument("--profile", type=int, metavar="N", help="Profile the next N dictations")
+    parser.add_argument("--profile-summary", nargs="*", metavar="DIR",
+                        help="Compare profiled dictations (default: all in .logs/profiles) and exit")
+    
+    soak = parser.add_argument_group("soak test")
+    soak.add_argument("--soak", action="store_true", help="Run the headless soak test and exit")
+    soak.add_argument("--soak-audio", metavar="FILE", help="Audio to replay (default: synthetic)")
+    soak.add_argument("--iterations", type=int, default=1000)
+    soak.add_argument("--rate", type=float, default=0, help="Dictations per minute (default: back to back)")
+    soak.add_argument("--max-in-flight", type=int, default=4, help="Dictations processed concurrently")
+    soak.add_argument("--realtime", action="store_true", help="Replay audio at real-time speed")
+    soak.add_argument("--format-latency-ms", type=int, default=50, help="Fake formatter response time")
+    soak.add_argument("--max-rss-growth-mb", type=float, default=150)
+    soak.add_argument("--max-thread-growth", type=int, default=8)
+    soak.add_argument("--max-open-files-growth", type=int, default=16)
+    soak.add_argument("--max-latency-drift", type=float, default=1.5,
+                      help="Allowed ratio of late to early median latency")
+    parser.add_argument("--check-resilience", action="store_true",
+                        help="Check formatting retries and fallback against injected errors and exit")
+    args = parser.parse_args()
+    
+    if args.server:
+        run_server(args.host, args.port)
+        return
+    
+    if args.transcribe:
+        run_batch(args.transcribe)
+        return
+    
+    if args.benchmark_wake:
+        run_wake_benchmark(args.benchmark_wake)
+        return
+    
+    if args.soak:
+        run_soak(args)
+        return
+    
+    if args.check_resilience:
+        run_resilience_check()
+        return
+    
+    if args.profile_summary is not None:
+        print(summarize(args.profile_summary))
+        return
+    
+    # Desktop-only imports, so the server and command line modes run headless
+    import tkinter as tk
+    from modules.record import AudioRecorder
+    from modules.inject import TextInjector
+    from modules.ui import VoiceAssistantUI
+    from modules.hotkey import HotkeyManager
+    from modules.wakeword import HandsFreeController
+    
     # Create necessary directories
     create_dirs()
     
+    # Load configuration
+    config = Config()
+    
     # Setup logging
-    logger = setup_logger()
+    logger = setup_logger(config)
     logger.info("Starting Voice-First Work Assistant")
     
-    # Load configuration
-    config = Config()
+    # Pick up external config edits live
+    config.start_watching()
+    
+    # Arm dictation profiling from the command line or config
+    profiler = setup_profiling(config, args.profile)
     
     # Initialize components
     recorder = AudioRecorder(config)
     transcriber = Transcriber(config)
-    formatter = TextFormatter(config)
+    formatter = create_formatter(config)
+    vocabulary = Vocabulary(config)
     injector = TextInjector()
     
     # Create the application window
@@ -53,21 +237,34 @@ def main():
     
     # Setup hotkey manager
     hotkey_manager = HotkeyManager(
-        toggle_callback=app.toggle_recording,
+        toggle_callback=app.request_toggle,
         config=config
     )
     
+    # Optional secondary hotkey that profiles the next dictations
+    profile_hotkey = HotkeyManager(
+        toggle_callback=lambda: profiler.arm(config.get("profile_dictations")),
+        config=config,
+        config_key="profile_hotkey"
+    )
+    
     # Connect components to UI
-    app.set_components(recorder, transcriber, formatter, injector)
+    app.set_components(recorder, transcriber, formatter, injector, vocabulary)
+    
+    # Listen for the wake phrase on the open capture stream
+    HandsFreeController(config, recorder, app.request_start, app.request_stop)
     
     # Start the application
     app.start()
-    root.protocol("WM_DELETE_WINDOW", lambda: on_close(root, hotkey_manager))
+    root.protocol("WM_DELETE_WINDOW", lambda: on_close(root, config, [hotkey_manager, profile_hotkey], recorder))
     root.mainloop()
 
-def on_close(root, hotkey_manager):
+def on_close(root, config, hotkey_managers, recorder):
     """Handle application closure"""
-    hotkey_manager.stop()
+    for hotkey_manager in hotkey_managers:
+        hotkey_manager.stop()
+    recorder.close()
+    config.close()
     root.destroy()
     sys.exit(0)
 
@@ -0,0 +1,221 @@
+import time
+import threading
+import logging
+from collections import deque
+import numpy as np
+import sounddevice as sd
+from modules.resample import StreamingResampler, downmix, resample
+
+logger = logging.getLogger('voice_assistant')
+
+class DeviceSource:
+    """Audio source that captures at the device's native rate and channels"""
+
+    def __init__(self, sample_rate, device=None):
+        self.sample_rate = sample_rate
+        self.device = device
+        self.stream = None
+        self.resampler = None
+        self.block_callback = None
+
+    def _negotiate(self):
+        """Query the device's native sample rate and channel count"""
+        info = sd.query_devices(self.device, 'input')
+        native_rate = int(info['default_samplerate'])
+
+        # Stereo is enough to downmix, some interfaces expose dozens of inputs
+        channels = max(1, min(int(info['max_input_channels']), 2))
+
+        logger.info(
+            f"Input device: {info['name']} ({native_rate} Hz, {channels} ch), "
+            f"resampling to {self.sample_rate} Hz"
+        )
+        return native_rate, channels
+
+    def start(self, block_callback):
+        """Open the input stream and deliver mono blocks to the callback"""
+        self.block_callback = block_callback
+        native_rate, channels = self._negotiate()
+        self.resampler = StreamingResampler(native_rate, self.sample_rate)
+        self.stream = sd.InputStream(
+            samplerate=native_rate,
+            channels=channels,
+            dtype='float32',
+            device=self.device,
+            callback=self._callback
+        )
+        self.stream.start()
+
+    def _callback(self, indata, frames_count, time_info, status):
+        """Input stream callback"""
+        if status:
+            logger.warning(f"Audio status: {status}")
+        block = self.resampler.process(downmix(indata))
+        if len(block):
+            self.block_callback(block)
+
+    def stop(self):
+        """Close the input stream"""
+        if self.stream is not None:
+            self.stream.stop()
+            self.stream.close()
+            self.stream = None
+
+class BlockSource:
+    """Base class for sources that produce blocks from a background thread"""
+
+    def __init__(self, sample_rate, block_size=1024, realtime=True):
+        self.sample_rate = sample_rate
+        self.block_size = block_size
+        self.realtime = realtime
+        self.running = False
+        self.thread = None
+        self.block_callback = None
+
+    def start(self, block_callback):
+        """Start delivering blocks to the callback"""
+        self.block_callback = block_callback
+        self.running = True
+        self.thread = threading.Thread(target=self._run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def _blocks(self):
+        """Yield float32 mono blocks, implemented by subclasses"""
+        raise NotImplementedError
+
+    def _run(self):
+        """Deliver blocks, paced like a real device when realtime is set"""
+        next_time = time.monotonic()
+        try:
+            for block in self._blocks():
+                if not self.running:
+                    break
+
+                self.block_callback(np.asarray(block, dtype=np.float32))
+
+                if self.realtime:
+                    next_time += len(block) / self.sample_rate
+                    delay = next_time - time.monotonic()
+                    if delay > 0:
+                        time.sleep(delay)
+        except Exception as e:
+            logger.error(f"Error in audio source: {e}")
+
+    def stop(self):
+        """Stop delivering blocks"""
+        self.running = False
+        if self.thread:
+            self.thread.join()
+            self.thread = None
+
+class FileSource(BlockSource):
+    """Audio source that replays an audio file, for machines without devices"""
+
+    def __init__(self, path, sample_rate, block_size=1024, realtime=True, loop=False):
+        super().__init__(sample_rate, block_size, realtime)
+        self.path = path
+        self.loop = loop
+        self.audio = self._read(path)
+
+    def _read(self, path):
+        """Read the file as mono float32 at the target sample rate"""
+        import soundfile as sf
+        data, file_rate = sf.read(path, dtype='float32', always_2d=True)
+        return resample(downmix(data), file_rate, self.sample_rate)
+
+    def _blocks(self):
+        while True:
+            for start in range(0, len(self.audio), self.block_size):
+                yield self.audio[start:start + self.block_size]
+            if not self.loop:
+                return
+
+class GeneratorSource(BlockSource):
+    """Audio source that pulls blocks from an iterable or generator"""
+
+    def __init__(self, blocks, sample_rate, realtime=True):
+        super().__init__(sample_rate, realtime=realtime)
+        self.blocks = blocks
+
+    def _blocks(self):
+        return iter(self.blocks)
+
+def create_source(config, sample_rate):
+    """Create the audio source configured for capture"""
+    source_file = config.get("audio_source")
+    if source_file:
+        logger.info(f"Using file audio source: {source_file}")
+        return FileSource(source_file, sample_rate, loop=True)
+    return DeviceSource(sample_rate)
+
+class ContinuousCapture:
+    """Keeps one source open and cuts segments with a rolling pre-roll"""
+
+    def __init__(self, source, sample_rate, preroll_seconds=0.5):
+        self.source = source
+        self.sample_rate = sample_rate
+        self.preroll_samples = int(sample_rate * preroll_seconds)
+        self.opened = False
+
+        self._lock = threading.Lock()
+        self._preroll = deque()
+        self._preroll_length = 0
+        self._segment = []
+        self._active = False
+        self.listeners = []
+
+    def add_listener(self, listener):
+        """Also deliver every captured block to listener(block), e.g. a keyword spotter"""
+        self.listeners.append(listener)
+
+    def open(self):
+        """Start the source, it stays open until close is called"""
+        if self.opened:
+            return
+        self.source.start(self._on_block)
+        self.opened = True
+        logger.info("Continuous capture started")
+
+    def _on_block(self, block):
+        """Append a block to the active segment and the pre-roll buffer"""
+        with self._lock:
+            if self._active:
+                self._segment.append(block)
+
+            self._preroll.append(block)
+            self._preroll_length += len(block)
+
+            # Drop whole blocks that are no longer needed for the pre-roll
+            while self._preroll and self._preroll_length - len(self._preroll[0]) >= self.preroll_samples:
+                self._preroll_length -= len(self._preroll.popleft())
+
+        for listener in self.listeners:
+            listener(block)
+
+    def mark_start(self, include_preroll=True):
+        """Begin a segment, seeded with the buffered pre-roll"""
+        with self._lock:
+            self._segment = []
+            if include_preroll and self._preroll and self.preroll_samples > 0:
+                preroll = np.concatenate(self._preroll)[-self.preroll_samples:]
+                self._segment.append(preroll)
+            self._active = True
+
+    def mark_stop(self):
+        """End the current segment and return its audio, or None if empty"""
+        with self._lock:
+            self._active = False
+            segment = self._segment
+            self._segment = []
+
+        if not segment:
+            return None
+        return np.concatenate(segment)
+
+    def close(self):
+        """Stop the source"""
+        if self.opened:
+            self.source.stop()
+            self.opened = False
+            logger.info("Continuous capture stopped")
@@ -1,11 +1,21 @@
 import os
 import json
+import time
+import logging
+import stat
+import tempfile
+import threading
+from types import MappingProxyType
 from dotenv import load_dotenv
 
+logger = logging.getLogger('voice_assistant')
+
 class Config:
     """Configuration management for the Voice Assistant"""
     
-    def __init__(self):
+    FORMAT_MODES = ("general", "email", "bullets")
+    
+    def __init__(self, config_path="config.json"):
         # Load environment variables from .env file if it exists
         load_dotenv()
         
@@ -16,28 +26,97 @@ class Config:
             "sample_rate": 16000,
             "whisper_model": "small",
             "use_fp16": False,  # Set to False for compatibility with 4GB VRAM
+            "decoding_profile": "balanced",  # Options: fast, balanced, accurate
+            "language": None,  # Pin the spoken language (e.g. "en") to skip detection
+            "cache_language": True,  # Reuse the language detected on first use
+            "model_idle_unload_minutes": 30,  # Free the Whisper model after inactivity, 0 keeps it loaded
+            "cascade_enabled": False,  # Transcribe with a fast model first, escalate uncertain segments
+            "cascade_fast_model": "base",
+            "cascade_logprob_threshold": -0.7,
+            "cascade_compression_threshold": 2.2,
+            "cascade_no_speech_threshold": 0.5,
             "gemini_model": "gemini-pro",
+            "gemini_api_endpoint": None,  # Override the API endpoint, e.g. a local test server
+            "format_timeout": 20,  # Overall deadline per formatting request (seconds)
+            "format_attempt_timeout": 8,  # Deadline for a single attempt (seconds)
+            "format_max_retries": 2,
+            "format_rate_per_minute": 60,
+            "format_burst": 5,
+            "format_hedge": False,  # Send a duplicate request when the first is slower than p95
+            "format_hedge_min_delay": 1.0,  # seconds
+            "long_text_threshold": 4000,  # Transcripts longer than this (chars) are formatted in parallel chunks
+            "long_text_chunk_chars": 2000,
+            "long_text_workers": 4,
+            "breaker_failure_threshold": 5,  # Failures before falling back to raw text
+            "breaker_reset_seconds": 30,
             "format_mode": "general",  # Options: general, email, bullets
+            "format_backend": "gemini",  # Options: gemini, local
+            "local_model_path": "models/formatter.gguf",  # Quantized instruction model for the local backend
+            "local_n_ctx": 4096,
+            "local_n_threads": None,  # Defaults to the CPU count
+            "local_max_tokens": 1024,
+            "local_temperature": 0.2,
+            "local_cache_mb": 512,  # Prompt prefix KV cache size
             "gui_theme": "light",
-            "log_level": "INFO"
+            "log_level": "INFO",  # Transcripts are only logged at DEBUG
+            "log_max_bytes": 5 * 1024 * 1024,  # Size rotation within a day
+            "log_backup_count": 3,
+            "log_retention_days": 14,
+            "profiling_enabled": False,  # Profile the next dictations into .logs/profiles
+            "profile_dictations": 1,  # Dictations profiled each time profiling is armed
+            "profile_hotkey": None,  # Optional hotkey that arms profiling, e.g. "ctrl+alt+p"
+            "feedback_sounds": True,
+            "start_sound_file": None,  # Optional custom start sound (wav/flac/ogg)
+            "stop_sound_file": None,  # Optional custom stop sound
+            "capture_mode": "on_demand",  # Options: on_demand, continuous
+            "preroll_seconds": 0.5,  # Audio kept from before the hotkey in continuous mode
+            "audio_source": None,  # Optional audio file to use instead of the microphone
+            "vocabulary_file": "vocabulary.txt",  # 'phrase => replacement' rules applied to transcripts
+            "vocabulary_cache": ".cache/vocabulary.json",  # Compiled rules, rebuilt when the file changes
+            "handsfree_enabled": False,  # Start dictating when the wake phrase is heard
+            "wake_templates": [],  # Recordings of the wake phrase to match against
+            "wake_threshold": 12.0,  # Lower is stricter, see --benchmark-wake
+            "wake_vad_margin_db": 12,  # How far above the noise floor counts as speech
+            "handsfree_silence_ms": 800,  # Silence that ends a hands-free dictation
+            "handsfree_max_seconds": 60,
+            "server_host": "127.0.0.1",
+            "server_port": 8765,
+            "server_max_pending": 32,  # Requests queued for the model before returning busy
+            "server_max_upload_mb": 50,
+            "max_batch_size": 8,  # Segments decoded together in one batch
+            "batch_window_ms": 50  # How long to wait for more segments to batch
         }
         
+        # Runtime state for persistence, file watching and subscriptions
+        self.config_path = config_path
+        self.save_delay = 0.5  # seconds to coalesce rapid set() calls
+        self._lock = threading.Lock()
+        self._save_timer = None
+        self._file_mtime = None
+        self._subscribers = []
+        self._transient = {}
+        self._watch_thread = None
+        self._watching = False
+        
         # Try to load config from file, use defaults if not found
-        self.config = self._load_config()
+        self._saved = self._load_config()
+        
+        # Immutable snapshot, replaced wholesale so reads never need the lock
+        self.config = MappingProxyType(dict(self._saved))
         
         # Ensure API key is set
         self._check_api_key()
     
     def _load_config(self):
         """Load configuration from config.json if it exists"""
-        config_path = "config.json"
         config = self.defaults.copy()
         
-        if os.path.exists(config_path):
+        if os.path.exists(self.config_path):
             try:
-                with open(config_path, 'r') as f:
+                with open(self.config_path, 'r') as f:
                     loaded_config = json.load(f)
                     config.update(loaded_config)
+                self._file_mtime = os.stat(self.config_path).st_mtime_ns
             except Exception as e:
                 print(f"Error loading config: {e}")
         else:
@@ -47,12 +126,47 @@ class Config:
         return config
     
     def _save_config(self, config):
-        """Save configuration to config.json"""
+        """Atomically save configuration to config.json"""
+        directory = os.path.dirname(os.path.abspath(self.config_path))
+        temp_path = None
         try:
-            with open("config.json", 'w') as f:
+            # Write a temp file next to config.json, then rename over it
+            with tempfile.NamedTemporaryFile(
+                'w', dir=directory, prefix=".config.", suffix=".tmp", delete=False
+            ) as f:
+                temp_path = f.name
                 json.dump(config, f, indent=4)
+                f.flush()
+                os.fsync(f.fileno())
+            
+            # Temp files are created 0600, keep the existing file's permissions
+            if os.path.exists(self.config_path):
+                os.chmod(temp_path, stat.S_IMODE(os.stat(self.config_path).st_mode))
+            os.replace(temp_path, self.config_path)
+            
+            # Remember our own write so the watcher doesn't reload it
+            self._file_mtime = os.stat(self.config_path).st_mtime_ns
         except Exception as e:
             print(f"Error saving config: {e}")
+            if temp_path and os.path.exists(temp_path):
+                os.remove(temp_path)
+    
+    def _schedule_save(self):
+        """Debounce writes, only the last of a burst of changes hits the disk"""
+        if self._save_timer:
+            self._save_timer.cancel()
+        self._save_timer = threading.Timer(self.save_delay, self.flush)
+        self._save_timer.daemon = True
+        self._save_timer.start()
+    
+    def flush(self):
+        """Write pending changes to disk now"""
+        with self._lock:
+            if self._save_timer:
+                self._save_timer.cancel()
+                self._save_timer = None
+            saved = dict(self._saved)
+            self._save_config(saved)
     
     def _check_api_key(self):
         """Check if Google API key is set"""
@@ -65,14 +179,96 @@ class Config:
         """Get a configuration value"""
         return self.config.get(key, self.defaults.get(key))
     
-    def set(self, key, value):
-        """Set a configuration value and save to file"""
-        self.config[key] = value
-        self._save_config(self.config)
+    def set(self, key, value, persist=True):
+        """Set a configuration value, saved to file shortly after unless persist is False"""
+        with self._lock:
+            if persist:
+                self._saved[key] = value
+                self._transient.pop(key, None)
+            else:
+                self._transient[key] = value
+            
+            old_value = self.config.get(key)
+            self.config = MappingProxyType({**self._saved, **self._transient})
+            
+            if persist:
+                self._schedule_save()
+        
+        if old_value != value:
+            self._notify({key: value})
+    
+    def subscribe(self, callback, keys=None):
+        """Call callback(changes) when any of keys (or any key) changes
+        
+        changes maps each changed key to its new value. Callbacks run on the
+        thread that made the change, or on the file watcher thread.
+        """
+        self._subscribers.append((callback, set(keys) if keys else None))
+    
+    def unsubscribe(self, callback):
+        """Remove a change subscription"""
+        self._subscribers = [s for s in self._subscribers if s[0] != callback]
+    
+    def _notify(self, changes):
+        """Deliver changes to interested subscribers"""
+        for callback, keys in list(self._subscribers):
+            relevant = changes if keys is None else {k: v for k, v in changes.items() if k in keys}
+            if not relevant:
+                continue
+            try:
+                callback(relevant)
+            except Exception as e:
+                logger.error(f"Error in config change subscriber: {e}")
     
-    def get_prompt_template(self):
+    def start_watching(self, interval=1.0):
+        """Poll config.json for external edits and apply them live"""
+        if self._watch_thread is None:
+            self._watching = True
+            self._watch_thread = threading.Thread(target=self._watch, args=(interval,))
+            self._watch_thread.daemon = True
+            self._watch_thread.start()
+    
+    def _watch(self, interval):
+        """File watcher loop"""
+        while self._watching:
+            time.sleep(interval)
+            try:
+                mtime = os.stat(self.config_path).st_mtime_ns
+            except OSError:
+                continue
+            if mtime != self._file_mtime:
+                self._reload()
+    
+    def _reload(self):
+        """Reload config.json after an external edit"""
+        try:
+            with open(self.config_path, 'r') as f:
+                loaded_config = json.load(f)
+            self._file_mtime = os.stat(self.config_path).st_mtime_ns
+        except Exception as e:
+            # Probably caught mid-edit, try again on the next poll
+            logger.warning(f"Error reloading config: {e}")
+            return
+        
+        with self._lock:
+            old = self.config
+            self._saved = {**self.defaults, **loaded_config}
+            self.config = MappingProxyType({**self._saved, **self._transient})
+            changes = {k: v for k, v in self.config.items() if old.get(k) != v}
+        
+        if changes:
+            logger.info(f"Config reloaded, changed: {', '.join(changes)}")
+            self._notify(changes)
+    
+    def close(self):
+        """Stop watching and write any pending changes"""
+        self._watching = False
+        if self._save_timer:
+            self.flush()
+    
+    def get_prompt_template(self, format_mode=None):
         """Get the appropriate prompt template based on format mode"""
-        format_mode = self.get("format_mode")
+        format_mode = format_mode or self.get("format_mode")
         
         templates = {
             "general": """
@@ -96,6 +292,21 @@ class Config:
             Convert this transcribed text into a clean, readable bullet point list.
             Use sentence casing and clarity.
             Text: "{transcribed_text}"
+            """,
+            
+            # Used to format long emails section by section
+            "email_body": """
+            Act as a professional assistant. Turn the following spoken notes into body paragraphs of a formal email:
+            - Do not add a greeting, subject or sign-off
+            - Fix grammar and add bullet points if necessary
+            - Maintain a polite tone
+            Notes: "{transcribed_text}"
+            """,
+            
+            "email_frame": """
+            Write only the greeting line and the sign-off for a formal email whose body begins as below.
+            Reply with the greeting, then a line containing only ---, then the sign-off.
+            Body: "{transcribed_text}"
             """
         }
         
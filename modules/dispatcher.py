@@ -0,0 +1,102 @@
+import queue
+import logging
+import tkinter as tk
+
+logger = logging.getLogger('voice_assistant')
+
+class UIDispatcher:
+    """Class to queue UI updates from any thread and apply them on the Tk thread
+
+    Updates are drained once per frame. Status updates collapse to the latest
+    one, and text replacements/appends per widget are merged into a single
+    widget edit.
+    """
+
+    def __init__(self, root, interval_ms=16):
+        self.root = root
+        self.interval_ms = interval_ms
+        self.queue = queue.SimpleQueue()
+        self.status_handler = None
+        self.running = False
+
+    def start(self, status_handler):
+        """Start draining on the Tk thread, status_handler(text, color) applies status"""
+        self.status_handler = status_handler
+        self.running = True
+        self.root.after(self.interval_ms, self._drain)
+
+    def stop(self):
+        """Stop draining"""
+        self.running = False
+
+    def set_status(self, text, color):
+        """Request a status update, only the latest per frame is applied"""
+        self.queue.put(("status", text, color))
+
+    def set_text(self, widget, text):
+        """Request replacing a text widget's contents"""
+        self.queue.put(("set_text", widget, text))
+
+    def append_text(self, widget, text):
+        """Request appending to a text widget, appends are batched per frame"""
+        self.queue.put(("append_text", widget, text))
+
+    def call(self, func, *args):
+        """Run func(*args) on the Tk thread, in order with other updates"""
+        self.queue.put(("call", func, args))
+
+    def _drain(self):
+        """Apply everything queued since the last frame"""
+        if not self.running:
+            return
+
+        status = None
+        pending_text = {}
+
+        while True:
+            try:
+                intent = self.queue.get_nowait()
+            except queue.Empty:
+                break
+
+            kind = intent[0]
+            if kind == "status":
+                status = intent[1:]
+            elif kind == "set_text":
+                # A replacement discards appends queued before it
+                pending_text[intent[1]] = (True, [intent[2]])
+            elif kind == "append_text":
+                replace, parts = pending_text.get(intent[1], (False, []))
+                parts.append(intent[2])
+                pending_text[intent[1]] = (replace, parts)
+            elif kind == "call":
+                # Calls may read widgets, so apply earlier text edits first
+                self._apply_text(pending_text)
+                pending_text = {}
+                self._run(intent[1], intent[2])
+
+        self._apply_text(pending_text)
+        if status is not None and self.status_handler:
+            self._run(self.status_handler, status)
+
+        try:
+            self.root.after(self.interval_ms, self._drain)
+        except tk.TclError:
+            # Window was destroyed
+            self.running = False
+
+    def _apply_text(self, pending_text):
+        """Apply merged text edits, one widget operation per widget"""
+        for widget, (replace, parts) in pending_text.items():
+            try:
+                if replace:
+                    widget.delete(1.0, tk.END)
+                widget.insert(tk.END, "".join(parts))
+            except tk.TclError as e:
+                logger.error(f"Error updating text widget: {e}")
+
+    def _run(self, func, args):
+        try:
+            func(*args)
+        except Exception as e:
+            logger.error(f"Error in UI update: {e}")
@@ -0,0 +1,196 @@
+import time
+import asyncio
+import logging
+import threading
+from aiohttp import web
+
+logger = logging.getLogger('voice_assistant')
+
+# Status names Gemini puts in error bodies
+ERROR_STATUSES = {
+    400: "INVALID_ARGUMENT",
+    429: "RESOURCE_EXHAUSTED",
+    500: "INTERNAL",
+    503: "UNAVAILABLE",
+    504: "DEADLINE_EXCEEDED"
+}
+
+class FakeGeminiServer:
+    """Local stand-in for the Gemini REST API with injected latency and errors
+
+    Each request takes the next outcome from plan, then default once the
+    plan is used up. An outcome is "ok", an HTTP error status such as 429,
+    500 or 503, or "hang", which never answers until the server stops.
+    """
+
+    def __init__(self, latency_ms=50, plan=None, default="ok", host="127.0.0.1"):
+        self.latency = latency_ms / 1000
+        self.host = host
+        self.port = None
+        self.requests = 0
+        self.loop = None
+        self.runner = None
+        self.thread = None
+        self.set_plan(plan, default)
+        self._started = threading.Event()
+        self._stopping = None
+
+    @property
+    def endpoint(self):
+        return f"http://{self.host}:{self.port}"
+
+    def set_plan(self, plan=None, default="ok"):
+        """Replace the queued outcomes and the default outcome"""
+        self.plan = list(plan or [])
+        self.default = default
+
+    def start(self):
+        """Serve from a background event loop, returns once listening"""
+        self.thread = threading.Thread(target=self._run)
+        self.thread.daemon = True
+        self.thread.start()
+        self._started.wait()
+        return self
+
+    def _run(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self._stopping = asyncio.Event()
+
+        app = web.Application()
+        # Paths look like /v1beta/models/gemini-pro:generateContent
+        app.add_routes([web.post("/{path:.*}", self._handle_generate)])
+        self.runner = web.AppRunner(app)
+        self.loop.run_until_complete(self.runner.setup())
+        site = web.TCPSite(self.runner, self.host, 0)
+        self.loop.run_until_complete(site.start())
+        self.port = site._server.sockets[0].getsockname()[1]
+
+        self._started.set()
+        self.loop.run_forever()
+
+    async def _handle_generate(self, request):
+        self.requests += 1
+        outcome = self.plan.pop(0) if self.plan else self.default
+        body = await request.json()
+        prompt = body["contents"][-1]["parts"][-1]["text"]
+
+        if outcome == "hang":
+            await self._stopping.wait()
+            return web.Response(status=503)
+
+        await asyncio.sleep(self.latency)
+        if outcome != "ok":
+            return web.json_response({
+                "error": {
+                    "code": outcome,
+                    "message": f"Injected {outcome} error",
+                    "status": ERROR_STATUSES.get(outcome, "UNKNOWN")
+                }
+            }, status=outcome)
+
+        return web.json_response({
+            "candidates": [{
+                "content": {"role": "model", "parts": [{"text": f"Formatted {len(prompt)} chars."}]},
+                "finishReason": "STOP",
+                "index": 0
+            }]
+        })
+
+    def stop(self):
+        """Release hung requests and shut down"""
+        if self.loop:
+            self.loop.call_soon_threadsafe(self._stopping.set)
+            asyncio.run_coroutine_threadsafe(self.runner.cleanup(), self.loop).result(timeout=5)
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.thread.join(timeout=5)
+
+def check_resilience(config):
+    """Drive TextFormatter's retry, hedge, timeout and breaker paths against the fake server
+
+    Returns a list of (name, passed, detail) tuples.
+    """
+    from modules.format import TextFormatter
+
+    server = FakeGeminiServer(latency_ms=20).start()
+    overrides = {
+        "gemini_api_endpoint": server.endpoint,
+        "format_timeout": 3,
+        "format_attempt_timeout": 1,
+        "format_max_retries": 3,
+        "format_rate_per_minute": 6000,
+        "format_burst": 100,
+        "format_hedge": False,
+        "format_hedge_min_delay": 0.2,
+        "breaker_failure_threshold": 3,
+        "breaker_reset_seconds": 60,
+        "long_text_threshold": 1_000_000
+    }
+    for key, value in overrides.items():
+        config.set(key, value, persist=False)
+
+    transcript = "this is the raw transcript"
+
+    def format_once(formatter):
+        """Format synchronously, returns (text, error, seconds, server requests)"""
+        done = threading.Event()
+        result = {}
+
+        def on_complete(text, error):
+            result.update(text=text, error=error)
+            done.set()
+
+        requests_before = server.requests
+        started = time.monotonic()
+        formatter.format_text(transcript, on_complete)
+        done.wait(timeout=30)
+        return result.get("text"), result.get("error"), time.monotonic() - started, server.requests - requests_before
+
+    results = []
+
+    def check(name, passed, detail):
+        results.append((name, passed, detail))
+        logger.info(f"Resilience check {name}: {'ok' if passed else 'FAILED'} ({detail})")
+
+    try:
+        # Transient errors are retried until the service answers
+        server.set_plan([503, 429])
+        text, error, seconds, requests = format_once(TextFormatter(config))
+        check("retry", error is None and text != transcript and requests == 3,
+              f"{requests} requests, {seconds:.2f}s, error={error}")
+
+        # A hung first request is overtaken by a hedged duplicate
+        config.set("format_hedge", True, persist=False)
+        server.set_plan(["hang"])
+        text, error, seconds, requests = format_once(TextFormatter(config))
+        check("hedge", error is None and text != transcript and requests == 2 and seconds < 1,
+              f"{requests} requests, {seconds:.2f}s, error={error}")
+        config.set("format_hedge", False, persist=False)
+
+        # A service that never answers falls back to the raw transcript by the deadline
+        server.set_plan(default="hang")
+        text, error, seconds, requests = format_once(TextFormatter(config))
+        check("deadline", text == transcript and error is not None and seconds < 3.5,
+              f"{requests} requests, {seconds:.2f}s, error={error}")
+
+        # Repeated hangs open the breaker instead of every dictation waiting out the deadline
+        formatter = TextFormatter(config)
+        runs = [format_once(formatter) for _ in range(3)]
+        text, error, seconds, requests = runs[-1]
+        check("repeated hang", all(run[0] == transcript for run in runs)
+              and max(run[2] for run in runs) < 3.5 and requests == 0 and seconds < 0.5,
+              f"breaker {formatter.client.breaker.state}, "
+              f"{', '.join(f'{run[2]:.2f}s' for run in runs)}, {requests} requests on the last call")
+
+        # Repeated failures open the breaker, later requests skip the service entirely
+        server.set_plan(default=500)
+        formatter = TextFormatter(config)
+        text, error, seconds, requests = format_once(formatter)
+        first_ok = text == transcript and error is not None
+        text, error, seconds, requests = format_once(formatter)
+        check("breaker", first_ok and text == transcript and requests == 0 and seconds < 0.5,
+              f"breaker {formatter.client.breaker.state}, {requests} requests on the second call, error={error}")
+    finally:
+        server.stop()
+
+    return results
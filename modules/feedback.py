@@ -0,0 +1,155 @@
+import threading
+import logging
+import numpy as np
+import sounddevice as sd
+from modules.resample import downmix, resample
+
+logger = logging.getLogger('voice_assistant')
+
+class FeedbackPlayer:
+    """Class to play short feedback sounds without blocking the caller"""
+
+    def __init__(self, config):
+        self.config = config
+        self.enabled = config.get("feedback_sounds")
+        self.sample_rate = 44100
+        self.stream = None
+        self.stream_thread = None
+
+        # Sound currently being played by the stream callback and its position
+        self._lock = threading.Lock()
+        self._buffer = None
+        self._position = 0
+
+        # Precompute the default tones once
+        self.tone_frequencies = {"start": 800, "stop": 400}
+        self.sounds = {
+            name: self._make_tone(frequency)
+            for name, frequency in self.tone_frequencies.items()
+        }
+
+        # Replace defaults with custom sounds if configured
+        self._load_custom_sound("start", config.get("start_sound_file"))
+        self._load_custom_sound("stop", config.get("stop_sound_file"))
+
+        # Open the output stream in the background so startup is not delayed
+        if self.enabled:
+            self._open_stream_async()
+
+        config.subscribe(
+            self._on_config_changed,
+            keys=["feedback_sounds", "start_sound_file", "stop_sound_file"]
+        )
+
+    def _on_config_changed(self, changes):
+        """Apply feedback sound settings live"""
+        if "feedback_sounds" in changes:
+            self.enabled = changes["feedback_sounds"]
+            if self.enabled:
+                self._open_stream_async()
+
+        for name in ("start", "stop"):
+            key = f"{name}_sound_file"
+            if key in changes:
+                # Fall back to the default tone when the file is cleared
+                self.sounds[name] = self._make_tone(self.tone_frequencies[name])
+                self._load_custom_sound(name, changes[key])
+
+    def _make_tone(self, frequency, duration=0.1, volume=0.5):
+        """Generate a sine wave beep with short fades to avoid clicks"""
+        num_samples = int(self.sample_rate * duration)
+        t = np.arange(num_samples, dtype=np.float32) / self.sample_rate
+        tone = volume * np.sin(2 * np.pi * frequency * t)
+
+        # 5 ms linear fade in and out
+        fade = min(int(self.sample_rate * 0.005), num_samples // 2)
+        if fade:
+            ramp = np.linspace(0.0, 1.0, fade, dtype=np.float32)
+            tone[:fade] *= ramp
+            tone[-fade:] *= ramp[::-1]
+
+        return tone.astype(np.float32)
+
+    def _load_custom_sound(self, name, path):
+        """Load a custom sound file, resampled to the output rate"""
+        if not path:
+            return
+
+        try:
+            import soundfile as sf
+            data, file_rate = sf.read(path, dtype='float32', always_2d=True)
+
+            # Downmix to mono and resample to the output stream rate
+            data = resample(downmix(data), file_rate, self.sample_rate)
+
+            self.sounds[name] = np.ascontiguousarray(data, dtype=np.float32)
+            logger.info(f"Loaded custom {name} sound: {path}")
+        except Exception as e:
+            logger.error(f"Error loading {name} sound from {path}: {e}")
+
+    def _open_stream_async(self):
+        """Open the output stream in a background thread"""
+        if self.stream_thread is None:
+            self.stream_thread = threading.Thread(target=self._open_stream)
+            self.stream_thread.daemon = True
+            self.stream_thread.start()
+
+    def _open_stream(self):
+        """Open a persistent output stream that plays queued sounds"""
+        try:
+            stream = sd.OutputStream(
+                samplerate=self.sample_rate,
+                channels=1,
+                dtype='float32',
+                callback=self._callback
+            )
+            stream.start()
+            self.stream = stream
+            logger.info("Feedback output stream opened")
+        except Exception as e:
+            logger.error(f"Error opening feedback output stream: {e}")
+
+    def _callback(self, outdata, frames_count, time_info, status):
+        """Output stream callback, copies the next block of the active sound"""
+        outdata.fill(0)
+
+        with self._lock:
+            if self._buffer is None:
+                return
+
+            chunk = self._buffer[self._position:self._position + frames_count]
+            outdata[:len(chunk), 0] = chunk
+            self._position += len(chunk)
+
+            if self._position >= len(self._buffer):
+                self._buffer = None
+                self._position = 0
+
+    def play(self, name):
+        """Start playing a sound and return immediately"""
+        if not self.enabled:
+            return
+
+        sound = self.sounds.get(name)
+        if sound is None:
+            logger.warning(f"Unknown feedback sound: {name}")
+            return
+
+        if self.stream is None:
+            # Never wait for the device, a missed beep is better than a delay
+            logger.debug(f"Feedback stream not ready, skipping {name} sound")
+            return
+
+        with self._lock:
+            self._buffer = sound
+            self._position = 0
+
+    def close(self):
+        """Close the output stream"""
+        if self.stream is not None:
+            try:
+                self.stream.stop()
+                self.stream.close()
+            except Exception as e:
+                logger.error(f"Error closing feedback output stream: {e}")
+            self.stream = None
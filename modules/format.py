@@ -1,9 +1,85 @@
+import re
+import time
 import logging
 import threading
+from concurrent.futures import ThreadPoolExecutor
 import google.generativeai as genai
+from google.generativeai import client as genai_client
+from google.generativeai.types.generation_types import GenerateContentResponse
+from google.api_core import exceptions as api_exceptions
+from modules.logger import stage_extra
+from modules.resilience import ResilientClient, CircuitOpenError
+from modules.profiling import profile_stage
 
 logger = logging.getLogger('voice_assistant')
 
+# Errors that mean the service is slow or overloaded rather than the request being bad
+RETRYABLE_ERRORS = (
+    TimeoutError,
+    ConnectionError,
+    api_exceptions.TooManyRequests,
+    api_exceptions.ResourceExhausted,
+    api_exceptions.InternalServerError,
+    api_exceptions.ServiceUnavailable,
+    api_exceptions.GatewayTimeout,
+    api_exceptions.DeadlineExceeded
+)
+
+def split_text(text, max_chars):
+    """Split text at paragraph and sentence boundaries into chunks of at most max_chars"""
+    pieces = []
+    for paragraph in re.split(r"\n\s*\n", text.strip()):
+        for sentence in re.split(r"(?<=[.!?])\s+", paragraph.strip()):
+            # A run-on sentence with no punctuation is split on whitespace
+            while len(sentence) > max_chars:
+                cut = sentence.rfind(" ", 0, max_chars)
+                cut = cut if cut > 0 else max_chars
+                pieces.append((sentence[:cut], False))
+                sentence = sentence[cut:].lstrip()
+            if sentence:
+                pieces.append((sentence, False))
+        if pieces:
+            pieces[-1] = (pieces[-1][0], True)
+    
+    chunks = []
+    current = ""
+    for piece, ends_paragraph in pieces:
+        if current and len(current) + 1 + len(piece) > max_chars:
+            chunks.append(current)
+            current = ""
+        separator = "" if not current or current.endswith("\n\n") else " "
+        current = f"{current}{separator}{piece}"
+        if ends_paragraph and current and not current.endswith("\n\n"):
+            current += "\n\n"
+    if current:
+        chunks.append(current)
+    
+    return [chunk.strip() for chunk in chunks if chunk.strip()]
+
+def merge_bullets(parts):
+    """Merge bullet lists from several chunks into one list"""
+    lines = []
+    for part in parts:
+        for line in part.splitlines():
+            line = line.strip()
+            if not line:
+                continue
+            # Headings like "# Notes" or "**Notes:**" stay as they are
+            if line.startswith("#") or re.fullmatch(r"\*\*[^*]+\*\*:?", line):
+                lines.append(line)
+                continue
+            # Normalise *, • and - markers, but not emphasis like "*really*"
+            line = re.sub(r"^[*•-]\s+", "", line)
+            lines.append(f"- {line}")
+    return "\n".join(lines)
+
+def create_formatter(config):
+    """Create the formatting backend selected in config"""
+    if config.get("format_backend") == "local":
+        from modules.local_format import LocalFormatter
+        return LocalFormatter(config)
+    return TextFormatter(config)
+
 class TextFormatter:
     """Class to handle text formatting using Google's Gemini API"""
     
@@ -12,11 +88,42 @@ class TextFormatter:
         self.api_key = config.api_key
         self.model = config.get("gemini_model")
         
-        # Configure Gemini
+        # Configure Gemini, optionally against a local endpoint for testing
         if self.api_key:
-            genai.configure(api_key=self.api_key)
+            endpoint = config.get("gemini_api_endpoint")
+            if endpoint:
+                genai.configure(
+                    api_key=self.api_key,
+                    transport="rest",
+                    client_options={"api_endpoint": endpoint}
+                )
+            else:
+                genai.configure(api_key=self.api_key)
+        
+        # Deadlines, rate limiting, retries, hedging and circuit breaking,
+        # with a worker for every long-text chunk plus one for its hedge
+        self.client = ResilientClient(
+            self._generate,
+            config,
+            is_retryable=lambda e: isinstance(e, RETRYABLE_ERRORS),
+            max_workers=2 * max(2, config.get("long_text_workers"))
+        )
+    
+    def _generate(self, prompt, timeout):
+        """Single Gemini request, run by the resilient client
+
+        GenerativeModel.generate_content() can't take a timeout, and the
+        generated client under it retries 503s for up to 60s. Calling that
+        client directly puts the attempt timeout on the wire and leaves
+        ResilientClient as the only retry layer.
+        """
+        model = genai.GenerativeModel(self.model)
+        request = model._prepare_request(contents=prompt)
+        client = model._client or genai_client.get_default_generative_client()
+        response = client.generate_content(request, timeout=timeout, retry=None)
+        return GenerateContentResponse.from_response(response).text.strip()
     
-    def format_text(self, text, callback=None):
+    def format_text(self, text, callback=None, format_mode=None):
         """Format transcribed text using Gemini"""
         if not text:
             logger.warning("Empty text provided for formatting")
@@ -36,7 +143,7 @@ class TextFormatter:
             # Start formatting in a separate thread
             thread = threading.Thread(
                 target=self._format_text_thread,
-                args=(text, callback)
+                args=(text, callback, format_mode)
             )
             thread.daemon = True
             thread.start()
@@ -50,34 +157,110 @@ class TextFormatter:
             
             return text
     
-    def _format_text_thread(self, text, callback):
+    def _format_text_thread(self, text, callback, format_mode=None):
         """Format text in a separate thread"""
+        started = time.perf_counter()
         try:
-            # Get prompt template based on format mode
-            prompt_template = self.config.get_prompt_template()
-            prompt = prompt_template.format(transcribed_text=text)
+            with profile_stage("format"):
+                if len(text) > self.config.get("long_text_threshold"):
+                    # Long dictation, format chunks concurrently and merge
+                    formatted_text, error = self._format_long(text, format_mode)
+                else:
+                    # Get prompt template based on format mode
+                    prompt_template = self.config.get_prompt_template(format_mode)
+                    prompt = prompt_template.format(transcribed_text=text)
+                    
+                    # Generate formatted text, bounded by the formatting deadline
+                    formatted_text, error = self.client.generate(prompt), None
             
-            # Initialize Gemini model
-            model = genai.GenerativeModel(self.model)
-            
-            # Generate formatted text
-            response = model.generate_content(prompt)
-            formatted_text = response.text.strip()
-            
-            logger.info("Text formatting complete")
+            logger.info("Text formatting complete", extra=stage_extra("format", started))
             
             # Call the callback with the formatted text
             if callback:
-                callback(formatted_text, None)
+                callback(formatted_text, error)
             
             return formatted_text
         
+        except CircuitOpenError:
+            error_msg = "Formatting service unavailable. Using unformatted text."
+            logger.warning(error_msg, extra=stage_extra("format", started))
+            
+            if callback:
+                callback(text, error_msg)
+            
+            return text
+        
+        except TimeoutError as e:
+            error_msg = f"Formatting timed out ({e}). Using unformatted text."
+            logger.error(error_msg, extra=stage_extra("format", started))
+            
+            if callback:
+                callback(text, error_msg)
+            
+            return text
+        
         except Exception as e:
             error_msg = f"Error in Gemini formatting: {e}"
-            logger.error(error_msg)
+            logger.error(error_msg, extra=stage_extra("format", started))
             
             # Call the callback with the original text and error
             if callback:
                 callback(text, error_msg)
             
-            return text
\ No newline at end of file
+            return text
+    
+    def _format_long(self, text, format_mode=None):
+        """Format a long transcript as concurrent chunks, returns (text, error)"""
+        format_mode = format_mode or self.config.get("format_mode")
+        chunks = split_text(text, self.config.get("long_text_chunk_chars"))
+        logger.info(f"Formatting long text in {len(chunks)} chunks")
+        
+        # Emails are formatted as body sections, then framed once at the end
+        chunk_mode = "email_body" if format_mode == "email" else format_mode
+        template = self.config.get_prompt_template(chunk_mode)
+        
+        def format_chunk(chunk):
+            return self.client.generate(template.format(transcribed_text=chunk))
+        
+        # Never more chunks in flight than the client has workers for, counting hedges
+        workers = max(1, min(self.config.get("long_text_workers"), self.client.max_workers // 2))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(format_chunk, chunk) for chunk in chunks]
+        
+        # Keep the raw text of any chunk that failed
+        parts = []
+        errors = []
+        for chunk, future in zip(chunks, futures):
+            if future.exception() is None:
+                parts.append(future.result())
+            else:
+                errors.append(future.exception())
+                parts.append(chunk)
+        
+        if len(errors) == len(chunks):
+            raise errors[0]
+        
+        if format_mode == "bullets":
+            formatted_text = merge_bullets(parts)
+        elif format_mode == "email":
+            formatted_text = self._frame_email("\n\n".join(parts))
+        else:
+            formatted_text = "\n\n".join(parts)
+        
+        error = None
+        if errors:
+            error = f"{len(errors)} of {len(chunks)} sections could not be formatted: {errors[0]}"
+        return formatted_text, error
+    
+    def _frame_email(self, body):
+        """Add one greeting and sign-off around an email body"""
+        template = self.config.get_prompt_template("email_frame")
+        try:
+            frame = self.client.generate(template.format(transcribed_text=body[:1000]))
+            greeting, _, sign_off = frame.partition("---")
+            if not sign_off:
+                return body
+            return f"{greeting.strip()}\n\n{body}\n\n{sign_off.strip()}"
+        except Exception as e:
+            logger.warning(f"Could not add email greeting and sign-off: {e}")
+            return body
\ No newline at end of file
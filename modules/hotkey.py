@@ -6,17 +6,23 @@ logger = logging.getLogger('voice_assistant')
 class HotkeyManager:
     """Class to handle global hotkeys"""
     
-    def __init__(self, toggle_callback, config):
+    def __init__(self, toggle_callback, config, config_key="hotkey"):
         self.config = config
+        self.config_key = config_key
         self.toggle_callback = toggle_callback
-        self.hotkey = config.get("hotkey")
+        self.hotkey = config.get(config_key)
         self.active = False
         
         # Register hotkey
         self.register_hotkey()
+        
+        # Rebind when the hotkey is changed in config
+        config.subscribe(self._on_config_changed, keys=[config_key])
     
     def register_hotkey(self):
-        """Register the global hotkey"""
+        """Register the global hotkey, if one is configured"""
+        if not self.hotkey:
+            return
         try:
             keyboard.add_hotkey(self.hotkey, self.on_hotkey_pressed)
             self.active = True
@@ -32,11 +38,21 @@ class HotkeyManager:
     
     def change_hotkey(self, new_hotkey):
         """Change the registered hotkey"""
+        self._rebind(new_hotkey)
+        self.config.set(self.config_key, new_hotkey)
+    
+    def _on_config_changed(self, changes):
+        """Rebind if the configured hotkey changed"""
+        if changes[self.config_key] != self.hotkey:
+            self._rebind(changes[self.config_key])
+    
+    def _rebind(self, new_hotkey):
+        """Replace the registered hotkey"""
         if self.active:
             keyboard.remove_hotkey(self.hotkey)
+            self.active = False
         
         self.hotkey = new_hotkey
-        self.config.set("hotkey", new_hotkey)
         self.register_hotkey()
         logger.info(f"Hotkey changed to: {new_hotkey}")
     
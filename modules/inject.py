@@ -2,6 +2,8 @@ import time
 import logging
 import threading
 import pyautogui
+from modules.logger import stage_extra
+from modules.profiling import profiler, profile_stage
 
 logger = logging.getLogger('voice_assistant')
 
@@ -31,16 +33,18 @@ class TextInjector:
     
     def _inject_text_thread(self, text, callback):
         """Inject text in a separate thread"""
+        started = time.perf_counter()
         try:
             logger.info(f"Injecting text: {len(text)} chars")
             
-            # Give user a short pause to focus on the target application
-            time.sleep(0.5)
+            with profile_stage("inject"):
+                # Give user a short pause to focus on the target application
+                time.sleep(0.5)
+                
+                # Type the text
+                pyautogui.write(text)
             
-            # Type the text
-            pyautogui.write(text)
-            
-            logger.info("Text injection complete")
+            logger.info("Text injection complete", extra=stage_extra("inject", started))
             
             # Call the callback with success
             if callback:
@@ -52,4 +56,7 @@ class TextInjector:
             
             # Call the callback with failure
             if callback:
-                callback(False, error_msg)
\ No newline at end of file
+                callback(False, error_msg)
+        
+        # Injection ends the dictation
+        profiler.end_dictation()
\ No newline at end of file
@@ -0,0 +1,100 @@
+import time
+import logging
+import threading
+from contextlib import contextmanager
+
+logger = logging.getLogger('voice_assistant')
+
+class ModelLifecycle:
+    """Class to track model state and unload a model after a period of inactivity"""
+
+    def __init__(self, name, unload, idle_seconds=0):
+        self.name = name
+        self.unload = unload
+        self.idle_seconds = idle_seconds
+        self.state = "unloaded"
+        self.active = 0
+        self.last_used = time.monotonic()
+        self.listeners = []
+
+        self._lock = threading.Lock()
+        self._state_changed = threading.Condition(self._lock)
+        self._watch_thread = None
+
+        if idle_seconds:
+            self._start_watching()
+
+    def add_listener(self, listener):
+        """Call listener(name, old_state, new_state) on every transition"""
+        self.listeners.append(listener)
+
+    def set_state(self, state):
+        """Record a state transition: unloaded, loading, loaded or unloading"""
+        with self._lock:
+            old_state = self.state
+            self.state = state
+            if state == "loaded":
+                self.last_used = time.monotonic()
+            self._state_changed.notify_all()
+
+        if old_state != state:
+            self._announce(old_state, state)
+
+    def _announce(self, old_state, state):
+        """Log a transition and notify listeners"""
+        logger.info(f"{self.name} model state: {old_state} -> {state}")
+        for listener in list(self.listeners):
+            try:
+                listener(self.name, old_state, state)
+            except Exception as e:
+                logger.error(f"Error in model state listener: {e}")
+
+    @contextmanager
+    def in_use(self):
+        """Mark the model busy so it is never unloaded mid-request"""
+        with self._lock:
+            # Let an unload already in progress finish, the caller then reloads
+            while self.state == "unloading":
+                self._state_changed.wait()
+            self.active += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.active -= 1
+                self.last_used = time.monotonic()
+
+    def set_idle_seconds(self, idle_seconds):
+        """Change the idle timeout, 0 disables unloading"""
+        self.idle_seconds = idle_seconds
+        if idle_seconds:
+            self._start_watching()
+
+    def _start_watching(self):
+        if self._watch_thread is None:
+            self._watch_thread = threading.Thread(target=self._watch)
+            self._watch_thread.daemon = True
+            self._watch_thread.start()
+
+    def _watch(self):
+        """Unload the model once it has been idle long enough"""
+        while True:
+            time.sleep(max(1, min(30, (self.idle_seconds or 60) / 4)))
+            if not self.idle_seconds:
+                continue
+
+            with self._lock:
+                idle = time.monotonic() - self.last_used
+                should_unload = self.state == "loaded" and self.active == 0 and idle >= self.idle_seconds
+                if should_unload:
+                    # Claim the transition so a new request sees the model as going away
+                    old_state, self.state = self.state, "unloading"
+
+            if should_unload:
+                logger.info(f"{self.name} model idle for {idle:.0f}s")
+                self._announce(old_state, "unloading")
+                try:
+                    self.unload()
+                except Exception as e:
+                    logger.error(f"Error unloading {self.name} model: {e}")
+                self.set_state("unloaded")
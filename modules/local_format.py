@@ -0,0 +1,151 @@
+import os
+import time
+import logging
+import threading
+from modules.logger import stage_extra
+from modules.profiling import profile_stage
+
+logger = logging.getLogger('voice_assistant')
+
+class LocalFormatter:
+    """Class to handle text formatting with a local llama.cpp model"""
+
+    # Partial output is streamed through partial_callback
+    streaming = True
+
+    def __init__(self, config):
+        self.config = config
+        self.model = None
+        self.model_path = config.get("local_model_path")
+        self.model_thread = None
+        self.model_loaded = False
+
+        # llama.cpp contexts are not thread-safe, one generation at a time
+        self._lock = threading.Lock()
+
+        # Load and warm the model in the background
+        self._load_model_async()
+
+    def _load_model_async(self):
+        """Load the local model in a background thread"""
+        if self.model_thread is None:
+            self.model_thread = threading.Thread(target=self._load_model)
+            self.model_thread.daemon = True
+            self.model_thread.start()
+
+    def _load_model(self):
+        """Load the model and prime the prompt cache"""
+        try:
+            from llama_cpp import Llama, LlamaRAMCache
+
+            logger.info(f"Loading local formatting model: {self.model_path}")
+            model = Llama(
+                model_path=self.model_path,
+                n_ctx=self.config.get("local_n_ctx"),
+                n_threads=self.config.get("local_n_threads") or os.cpu_count(),
+                verbose=False
+            )
+
+            # Saved KV states are looked up by longest token prefix, so the
+            # fixed part of each template is only evaluated once
+            model.set_cache(LlamaRAMCache(capacity_bytes=self.config.get("local_cache_mb") * 1024 * 1024))
+            self.model = model
+
+            self._warm_up()
+            self.model_loaded = True
+            logger.info("Local formatting model loaded")
+        except Exception as e:
+            logger.error(f"Error loading local formatting model: {e}")
+
+    def _warm_up(self):
+        """Evaluate every template prefix once so the first request is fast"""
+        started = time.perf_counter()
+        with self._lock:
+            for format_mode in self.config.FORMAT_MODES:
+                prompt = self._template_prefix(format_mode)
+                for _ in self._generate(prompt, max_tokens=1):
+                    pass
+        logger.info("Local formatting model warmed up", extra=stage_extra("warm_up", started))
+
+    def _template_prefix(self, format_mode):
+        """The part of a prompt template before the transcribed text"""
+        template = self.config.get_prompt_template(format_mode)
+        return template[:template.index("{transcribed_text}")]
+
+    def ensure_model_loaded(self):
+        """Ensure the model is loaded before formatting"""
+        if not self.model_loaded:
+            if self.model_thread and self.model_thread.is_alive():
+                logger.info("Waiting for local formatting model to load...")
+                self.model_thread.join()
+            else:
+                self._load_model()
+
+    def format_text(self, text, callback=None, format_mode=None, partial_callback=None):
+        """Format transcribed text using the local model"""
+        if not text:
+            logger.warning("Empty text provided for formatting")
+            if callback:
+                callback("", "Empty text provided")
+            return ""
+
+        logger.info("Formatting text with local model")
+
+        # Start formatting in a separate thread
+        thread = threading.Thread(
+            target=self._format_text_thread,
+            args=(text, callback, format_mode, partial_callback)
+        )
+        thread.daemon = True
+        thread.start()
+
+    def _format_text_thread(self, text, callback, format_mode=None, partial_callback=None):
+        """Format text in a separate thread, streaming partial output"""
+        started = time.perf_counter()
+        try:
+            self.ensure_model_loaded()
+            if self.model is None:
+                raise RuntimeError("Local formatting model not loaded")
+
+            prompt_template = self.config.get_prompt_template(format_mode)
+            prompt = prompt_template.format(transcribed_text=text)
+
+            parts = []
+            with self._lock, profile_stage("format"):
+                for piece in self._generate(prompt, self.config.get("local_max_tokens")):
+                    parts.append(piece)
+                    if partial_callback:
+                        partial_callback(piece)
+
+            formatted_text = "".join(parts).strip()
+
+            logger.info("Text formatting complete", extra=stage_extra("format", started))
+
+            # Call the callback with the formatted text
+            if callback:
+                callback(formatted_text, None)
+
+            return formatted_text
+
+        except Exception as e:
+            error_msg = f"Error in local formatting: {e}"
+            logger.error(error_msg, extra=stage_extra("format", started))
+
+            # Call the callback with the original text and error
+            if callback:
+                callback(text, error_msg)
+
+            return text
+
+    def _generate(self, prompt, max_tokens):
+        """Stream generated text pieces for a prompt, caller holds the lock"""
+        stream = self.model.create_chat_completion(
+            messages=[{"role": "user", "content": prompt}],
+            max_tokens=max_tokens,
+            temperature=self.config.get("local_temperature"),
+            stream=True
+        )
+        for chunk in stream:
+            piece = chunk["choices"][0]["delta"].get("content")
+            if piece:
+                yield piece
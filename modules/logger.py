@@ -1,39 +1,160 @@
 import os
+import re
+import time
+import queue
+import atexit
 import logging
-from datetime import datetime
+from datetime import datetime, timedelta
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+LOG_DIR = '.logs'
+
+# Listener that owns the real handlers, set once by setup_logger
+_listener = None
+
+class StructuredFormatter(logging.Formatter):
+    """Formatter that appends job id, stage and duration fields when present"""
+
+    FIELDS = (("job_id", "job"), ("stage", "stage"), ("duration_ms", "duration_ms"))
+
+    def format(self, record):
+        message = super().format(record)
+        fields = [
+            f"{label}={getattr(record, attr)}"
+            for attr, label in self.FIELDS
+            if getattr(record, attr, None) is not None
+        ]
+        if fields:
+            message = f"{message} [{' '.join(fields)}]"
+        return message
+
+class DailyRotatingFileHandler(RotatingFileHandler):
+    """File handler with one log per day, size rotation and bounded retention"""
+
+    DATE_PATTERN = re.compile(r"^(\d{4}-\d{2}-\d{2})\.txt(\.\d+)?$")
+
+    def __init__(self, directory, max_bytes, backup_count, retention_days):
+        self.directory = directory
+        self.retention_days = retention_days
+        self.current_date = datetime.now().strftime("%Y-%m-%d")
+        super().__init__(
+            self._path(self.current_date),
+            maxBytes=max_bytes,
+            backupCount=backup_count,
+            encoding='utf-8'
+        )
+        self._cleanup()
+
+    def _path(self, date):
+        return os.path.join(self.directory, f"{date}.txt")
+
+    def shouldRollover(self, record):
+        if datetime.now().strftime("%Y-%m-%d") != self.current_date:
+            return True
+        return super().shouldRollover(record)
+
+    def doRollover(self):
+        today = datetime.now().strftime("%Y-%m-%d")
+        if today == self.current_date:
+            # Same day, the file grew past max_bytes
+            super().doRollover()
+            return
+
+        # New day, switch to a new dated file
+        if self.stream:
+            self.stream.close()
+            self.stream = None
+        self.current_date = today
+        self.baseFilename = os.path.abspath(self._path(today))
+        self.stream = self._open()
+        self._cleanup()
+
+    def _cleanup(self):
+        """Delete dated log files older than the retention period"""
+        cutoff = (datetime.now() - timedelta(days=self.retention_days)).strftime("%Y-%m-%d")
+        try:
+            for name in os.listdir(self.directory):
+                match = self.DATE_PATTERN.match(name)
+                if match and match.group(1) < cutoff:
+                    os.remove(os.path.join(self.directory, name))
+        except OSError:
+            pass
+
+def setup_logger(config=None):
+    """Setup logger configuration
+
+    The logger only gets a QueueHandler, a background QueueListener does
+    the file and console I/O. Calling this again reuses the same setup.
+    """
+    global _listener
 
-def setup_logger():
-    """Setup logger configuration"""
-    # Create logs directory if it doesn't exist
-    os.makedirs('.logs', exist_ok=True)
-    
-    # Get current date for log file name
-    current_date = datetime.now().strftime("%Y-%m-%d")
-    log_file = os.path.join('.logs', f"{current_date}.txt")
-    
-    # Configure logger
     logger = logging.getLogger('voice_assistant')
-    logger.setLevel(logging.INFO)
-    
-    # Create file handler
-    file_handler = logging.FileHandler(log_file)
-    file_handler.setLevel(logging.INFO)
-    
+
+    level_name = config.get("log_level") if config else "INFO"
+    level = getattr(logging, str(level_name).upper(), logging.INFO)
+    logger.setLevel(level)
+
+    if _listener is not None:
+        return logger
+
+    # Create logs directory if it doesn't exist
+    os.makedirs(LOG_DIR, exist_ok=True)
+
+    # Create file handler with size and daily rotation
+    file_handler = DailyRotatingFileHandler(
+        LOG_DIR,
+        max_bytes=config.get("log_max_bytes") if config else 5 * 1024 * 1024,
+        backup_count=config.get("log_backup_count") if config else 3,
+        retention_days=config.get("log_retention_days") if config else 14
+    )
+
     # Create console handler
     console_handler = logging.StreamHandler()
-    console_handler.setLevel(logging.INFO)
-    
+
     # Create formatter and add it to the handlers
-    formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    formatter = StructuredFormatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
     file_handler.setFormatter(formatter)
     console_handler.setFormatter(formatter)
-    
-    # Add handlers to logger
-    logger.addHandler(file_handler)
-    logger.addHandler(console_handler)
-    
+
+    # Only the queue handler runs on the calling thread, it never blocks
+    log_queue = queue.SimpleQueue()
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+    logger.addHandler(QueueHandler(log_queue))
+    logger.propagate = False
+
+    _listener = QueueListener(log_queue, file_handler, console_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logger)
+
+    # Follow live log level changes
+    if config:
+        config.subscribe(
+            lambda changes: logger.setLevel(
+                getattr(logging, str(changes["log_level"]).upper(), logging.INFO)
+            ),
+            keys=["log_level"]
+        )
+
     return logger
 
+def shutdown_logger():
+    """Flush queued records and stop the listener thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+def stage_extra(stage, started=None, job_id=None):
+    """Build structured fields for a pipeline stage log record
+
+    started is a time.perf_counter() value taken when the stage began.
+    """
+    extra = {"stage": stage, "job_id": job_id, "duration_ms": None}
+    if started is not None:
+        extra["duration_ms"] = round((time.perf_counter() - started) * 1000)
+    return extra
+
 def get_logger():
     """Get the logger instance"""
-    return logging.getLogger('voice_assistant')
\ No newline at end of file
+    return logging.getLogger('voice_assistant')
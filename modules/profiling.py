@@ -0,0 +1,250 @@
+import os
+import io
+import json
+import time
+import atexit
+import pstats
+import cProfile
+import logging
+import threading
+import tracemalloc
+from datetime import datetime
+from contextlib import contextmanager
+
+logger = logging.getLogger('voice_assistant')
+
+PROFILE_DIR = os.path.join('.logs', 'profiles')
+
+class DictationProfile:
+    """CPU profiles, allocations and per-thread stage timings for one dictation"""
+
+    def __init__(self):
+        self.started_at = datetime.now()
+        self.started = time.perf_counter()
+        self.spans = []
+        self.stats = None
+        self._lock = threading.Lock()
+
+    def add(self, stage, started, ended, cpu_seconds=None, profile=None):
+        """Record a stage that ran on the current thread"""
+        with self._lock:
+            self.spans.append({
+                "stage": stage,
+                "thread": threading.current_thread().name,
+                "start_ms": round((started - self.started) * 1000, 1),
+                "duration_ms": round((ended - started) * 1000, 1),
+                "cpu_ms": None if cpu_seconds is None else round(cpu_seconds * 1000, 1)
+            })
+            if profile is not None:
+                if self.stats is None:
+                    self.stats = pstats.Stats(profile)
+                else:
+                    self.stats.add(profile)
+
+    def save(self, directory=PROFILE_DIR):
+        """Write profile.pstats, allocations.txt and timeline.json, returns the run directory"""
+        snapshot, peak = None, None
+        if tracemalloc.is_tracing():
+            snapshot = tracemalloc.take_snapshot()
+            peak = tracemalloc.get_traced_memory()[1]
+
+        run_dir = os.path.join(directory, self.started_at.strftime("%Y%m%d_%H%M%S_%f"))
+        os.makedirs(run_dir, exist_ok=True)
+
+        with self._lock:
+            if self.stats is not None:
+                self.stats.dump_stats(os.path.join(run_dir, "profile.pstats"))
+
+            if snapshot is not None:
+                # Leave out the profiler's own bookkeeping
+                snapshot = snapshot.filter_traces((
+                    tracemalloc.Filter(False, tracemalloc.__file__),
+                    tracemalloc.Filter(False, pstats.__file__),
+                    tracemalloc.Filter(False, __file__),
+                    tracemalloc.Filter(False, "<frozen importlib._bootstrap*>")
+                ))
+                with open(os.path.join(run_dir, "allocations.txt"), 'w', encoding='utf-8') as f:
+                    f.write(f"Peak traced memory: {peak / 1024:.0f} KiB\n")
+                    f.write("Largest allocations still held at the end of the dictation:\n")
+                    for stat in snapshot.statistics("lineno")[:30]:
+                        f.write(f"{stat}\n")
+
+            # Stage totals, time spent waiting shows as wall time without CPU time
+            totals = {}
+            for span in self.spans:
+                totals[span["stage"]] = round(totals.get(span["stage"], 0) + span["duration_ms"], 1)
+
+            with open(os.path.join(run_dir, "timeline.json"), 'w', encoding='utf-8') as f:
+                json.dump({
+                    "started_at": self.started_at.isoformat(),
+                    "total_ms": round((time.perf_counter() - self.started) * 1000, 1),
+                    "peak_traced_kib": None if peak is None else round(peak / 1024),
+                    "stages": totals,
+                    "spans": self.spans
+                }, f, indent=4)
+
+        return run_dir
+
+class DictationProfiler:
+    """Profiles the next N dictations end to end, from recording to injection
+
+    Pipeline stages wrap their work in profile_stage(), which is a cheap
+    no-op unless a dictation is being profiled. Each stage thread gets its
+    own cProfile profiler, and the results are merged per dictation.
+    """
+
+    def __init__(self):
+        self.remaining = 0
+        self.current = None
+        self.saving = 0
+        # Only stop tracing once idle if the profiler started it
+        self.owns_tracemalloc = False
+        self._lock = threading.Lock()
+
+    def arm(self, count=1):
+        """Profile the next count dictations"""
+        with self._lock:
+            self.remaining = count
+        logger.info(f"Profiling the next {count} dictation(s)")
+
+    def begin_dictation(self):
+        """Called when recording starts, opens a profile if armed
+
+        A profile still open from the previous dictation is saved on a
+        background thread, so starting a recording never waits on disk.
+        """
+        with self._lock:
+            previous, self.current = self.current, None
+            if previous is not None:
+                self.saving += 1
+            if self.remaining > 0:
+                self.remaining -= 1
+                if not tracemalloc.is_tracing():
+                    tracemalloc.start(25)
+                    self.owns_tracemalloc = True
+                self.current = DictationProfile()
+
+        if previous is not None:
+            # Not a daemon, so exiting still finishes the save
+            threading.Thread(target=self._save, args=(previous,), name="ProfileSave").start()
+
+    def end_dictation(self):
+        """Called when the dictation is injected, saves its profile"""
+        with self._lock:
+            profile, self.current = self.current, None
+            if profile is None:
+                return
+            self.saving += 1
+        self._save(profile)
+
+    def _save(self, profile):
+        try:
+            run_dir = profile.save()
+            logger.info(f"Dictation profile saved to {run_dir}")
+        except Exception as e:
+            logger.error(f"Error saving dictation profile: {e}")
+        finally:
+            with self._lock:
+                self.saving -= 1
+                if self.owns_tracemalloc and self.current is None and not self.saving:
+                    tracemalloc.stop()
+                    self.owns_tracemalloc = False
+
+    @contextmanager
+    def stage(self, name):
+        """Profile the enclosed work as a pipeline stage on this thread"""
+        profile = self.current
+        if profile is None:
+            yield
+            return
+
+        cpu_profile = cProfile.Profile()
+        try:
+            cpu_profile.enable()
+        except ValueError:
+            # Another profiler is active on this interpreter, keep timings only
+            cpu_profile = None
+
+        started = time.perf_counter()
+        cpu_started = time.thread_time()
+        try:
+            yield
+        finally:
+            if cpu_profile is not None:
+                cpu_profile.disable()
+            profile.add(name, started, time.perf_counter(), time.thread_time() - cpu_started, cpu_profile)
+
+    def span(self, name, started):
+        """Record wall-clock time for a stage that can't be profiled, e.g. audio callbacks"""
+        profile = self.current
+        if profile is not None:
+            profile.add(name, started, time.perf_counter())
+
+# Shared by every pipeline stage
+profiler = DictationProfiler()
+
+def setup_profiling(config, count=None):
+    """Arm profiling from config or the command line and follow config changes"""
+    if count:
+        profiler.arm(count)
+    elif config.get("profiling_enabled"):
+        profiler.arm(config.get("profile_dictations"))
+
+    config.subscribe(
+        lambda changes: changes["profiling_enabled"] and profiler.arm(config.get("profile_dictations")),
+        keys=["profiling_enabled"]
+    )
+    atexit.register(profiler.end_dictation)
+    return profiler
+
+def profile_stage(name):
+    """Context manager wrapping a pipeline stage, see DictationProfiler.stage"""
+    return profiler.stage(name)
+
+def summarize(run_dirs=None, directory=PROFILE_DIR, top=8):
+    """Text report comparing profiled dictations, newest last"""
+    if not run_dirs:
+        try:
+            run_dirs = sorted(
+                os.path.join(directory, name) for name in os.listdir(directory)
+                if os.path.isdir(os.path.join(directory, name))
+            )
+        except OSError:
+            run_dirs = []
+    if not run_dirs:
+        return "No dictation profiles found"
+
+    runs = []
+    for run_dir in run_dirs:
+        try:
+            with open(os.path.join(run_dir, "timeline.json"), 'r', encoding='utf-8') as f:
+                runs.append((run_dir, json.load(f)))
+        except (OSError, ValueError) as e:
+            logger.warning(f"Skipping profile {run_dir}: {e}")
+    if not runs:
+        return "No dictation profiles found"
+
+    # Stage timings side by side, one column per run
+    stages = []
+    for _, timeline in runs:
+        stages.extend(stage for stage in timeline["stages"] if stage not in stages)
+
+    lines = ["run".ljust(24) + "".join(stage[:12].rjust(13) for stage in stages) + "total".rjust(13)]
+    for run_dir, timeline in runs:
+        row = os.path.basename(run_dir)[:23].ljust(24)
+        for stage in stages:
+            duration = timeline["stages"].get(stage)
+            row += (f"{duration:.0f} ms" if duration is not None else "-").rjust(13)
+        lines.append(row + f"{timeline['total_ms']:.0f} ms".rjust(13))
+
+    # Hottest functions of the latest run
+    latest_dir = runs[-1][0]
+    stats_path = os.path.join(latest_dir, "profile.pstats")
+    if os.path.exists(stats_path):
+        stream = io.StringIO()
+        pstats.Stats(stats_path, stream=stream).sort_stats("cumulative").print_stats(top)
+        lines.append("")
+        lines.append(f"Top functions in {os.path.basename(latest_dir)} by cumulative time:")
+        lines.append(stream.getvalue().strip())
+
+    return "\n".join(lines)
@@ -3,17 +3,19 @@ import time
 import threading
 import logging
 import numpy as np
-import sounddevice as sd
 from datetime import datetime
 from pydub import AudioSegment
 from pydub.playback import play
+from modules.feedback import FeedbackPlayer
+from modules.capture import ContinuousCapture, create_source
+from modules.profiling import profiler, profile_stage
 
 logger = logging.getLogger('voice_assistant')
 
 class AudioRecorder:
     """Class to handle audio recording functionality"""
     
-    def __init__(self, config):
+    def __init__(self, config, source=None):
         self.config = config
         self.recording = False
         self.chunk_duration = config.get("chunk_duration")  # seconds
@@ -28,20 +30,87 @@ class AudioRecorder:
         # Initialize audio parameters
         self.channels = 1
         self.dtype = 'float32'
+        
+        # Feedback tones are precomputed and played on a persistent stream
+        self.feedback = FeedbackPlayer(config)
+        
+        # Audio source, a device by default or a file/generator for testing
+        self.custom_source = source is not None
+        self.source = source
+        self.capture = None
+        self.block_listeners = []
+        self.reconfigure_pending = False
+        self._setup_capture()
+        
+        # Capture settings are applied live, between recordings
+        config.subscribe(
+            self._on_config_changed,
+            keys=["sample_rate", "capture_mode", "preroll_seconds", "audio_source", "handsfree_enabled"]
+        )
+    
+    def _setup_capture(self):
+        """Create the audio source and, in continuous mode, open it"""
+        self.sample_rate = self.config.get("sample_rate")
+        if not self.custom_source:
+            self.source = create_source(self.config, self.sample_rate)
+        
+        # In continuous mode the source stays open and keeps a pre-roll,
+        # hands-free mode needs it to listen for the wake phrase
+        self.capture = None
+        if self.config.get("capture_mode") == "continuous" or self.config.get("handsfree_enabled"):
+            self.capture = ContinuousCapture(
+                self.source,
+                self.sample_rate,
+                self.config.get("preroll_seconds")
+            )
+            for listener in self.block_listeners:
+                self.capture.add_listener(listener)
+            try:
+                self.capture.open()
+            except Exception as e:
+                logger.error(f"Error starting continuous capture: {e}")
+                self.capture = None
+    
+    def _on_config_changed(self, changes):
+        """Rebuild the capture pipeline, waiting for any recording to finish"""
+        if self.recording:
+            self.reconfigure_pending = True
+            return
+        self._reconfigure()
+    
+    def _reconfigure(self):
+        """Close the current capture and set it up again from config"""
+        self.reconfigure_pending = False
+        if self.capture:
+            self.capture.close()
+        self._setup_capture()
+        logger.info("Audio capture reconfigured")
+    
+    def add_block_listener(self, listener):
+        """Deliver every captured block to listener(block) while capture is continuous"""
+        self.block_listeners.append(listener)
+        if self.capture:
+            self.capture.add_listener(listener)
     
     def set_callback(self, callback):
         """Set callback function to be called when recording is complete"""
         self.callback = callback
     
-    def start_recording(self):
+    def start_recording(self, preroll=True):
         """Start recording audio in a separate thread"""
         if self.recording:
             return
         
         self.recording = True
-        self.audio_thread = threading.Thread(target=self._record_audio)
-        self.audio_thread.daemon = True
-        self.audio_thread.start()
+        profiler.begin_dictation()
+        self.record_started = time.perf_counter()
+        if self.capture:
+            # Stream is already open, just mark the segment start
+            self.capture.mark_start(include_preroll=preroll)
+        else:
+            self.audio_thread = threading.Thread(target=self._record_audio)
+            self.audio_thread.daemon = True
+            self.audio_thread.start()
         
         logger.info("Recording started")
         
@@ -54,7 +123,14 @@ class AudioRecorder:
             return
         
         self.recording = False
-        if self.audio_thread:
+        if self.capture:
+            audio_data = self.capture.mark_stop()
+            profiler.span("record", self.record_started)
+            # The caller is usually the UI thread, so write the file elsewhere
+            save_thread = threading.Thread(target=self._save_recording, args=(audio_data,))
+            save_thread.daemon = True
+            save_thread.start()
+        elif self.audio_thread:
             self.audio_thread.join()
             self.audio_thread = None
         
@@ -62,41 +138,46 @@ class AudioRecorder:
         
         # Play a subtle beep to indicate recording has stopped
         self._play_stop_sound()
+        
+        if self.reconfigure_pending:
+            self._reconfigure()
     
     def _record_audio(self):
-        """Record audio for the specified duration"""
+        """Record audio until the recording flag is cleared"""
         frames = []
         
-        def callback(indata, frames_count, time_info, status):
-            if status:
-                logger.warning(f"Audio status: {status}")
-            frames.append(indata.copy())
+        try:
+            with profile_stage("record"):
+                self.source.start(frames.append)
+                try:
+                    # Continue recording while the flag is set
+                    while self.recording:
+                        time.sleep(0.1)
+                finally:
+                    self.source.stop()
+                
+                # Concatenate all audio frames
+                audio_data = np.concatenate(frames, axis=0) if frames else None
+            self._save_recording(audio_data)
+        
+        except Exception as e:
+            logger.error(f"Error recording audio: {e}")
+    
+    def _save_recording(self, audio_data):
+        """Save recorded audio to a file and notify the callback"""
+        if audio_data is None or len(audio_data) == 0:
+            logger.warning("No audio data recorded")
+            return
         
         try:
-            with sd.InputStream(
-                samplerate=self.sample_rate,
-                channels=self.channels,
-                dtype=self.dtype,
-                callback=callback
-            ):
-                # Continue recording while the flag is set
-                while self.recording:
-                    time.sleep(0.1)
-            
-            if not frames:
-                logger.warning("No audio data recorded")
-                return
-            
-            # Concatenate all audio frames
-            audio_data = np.concatenate(frames, axis=0)
-            
             # Generate unique filename with timestamp
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
             filename = os.path.join(self.recordings_dir, f"recording_{timestamp}.wav")
             
             # Save audio to file
             import soundfile as sf
-            sf.write(filename, audio_data, self.sample_rate)
+            with profile_stage("save"):
+                sf.write(filename, audio_data, self.sample_rate)
             
             logger.info(f"Audio saved to {filename}")
             
@@ -105,36 +186,18 @@ class AudioRecorder:
                 self.callback(filename)
         
         except Exception as e:
-            logger.error(f"Error recording audio: {e}")
+            logger.error(f"Error saving audio: {e}")
     
     def _play_start_sound(self):
         """Play a subtle beep to indicate recording has started"""
-        try:
-            # Generate a simple sine wave beep
-            sample_rate = 44100
-            duration = 0.1  # 100 ms
-            frequency = 800  # Hz
-            t = np.linspace(0, duration, int(sample_rate * duration), False)
-            beep = 0.5 * np.sin(2 * np.pi * frequency * t)
-            
-            # Play the beep
-            sd.play(beep, sample_rate)
-            sd.wait()
-        except Exception as e:
-            logger.error(f"Error playing start sound: {e}")
+        self.feedback.play("start")
     
     def _play_stop_sound(self):
         """Play a subtle beep to indicate recording has stopped"""
-        try:
-            # Generate a simple sine wave beep with lower frequency
-            sample_rate = 44100
-            duration = 0.1  # 100 ms
-            frequency = 400  # Hz
-            t = np.linspace(0, duration, int(sample_rate * duration), False)
-            beep = 0.5 * np.sin(2 * np.pi * frequency * t)
-            
-            # Play the beep
-            sd.play(beep, sample_rate)
-            sd.wait()
-        except Exception as e:
-            logger.error(f"Error playing stop sound: {e}")
\ No newline at end of file
+        self.feedback.play("stop")
+    
+    def close(self):
+        """Release audio resources"""
+        if self.capture:
+            self.capture.close()
+        self.feedback.close()
\ No newline at end of file
@@ -0,0 +1,81 @@
+from math import gcd
+import numpy as np
+
+def downmix(block):
+    """Average a (frames, channels) block down to mono float32"""
+    block = np.asarray(block, dtype=np.float32)
+    if block.ndim == 1:
+        return block
+    if block.shape[1] == 1:
+        return block[:, 0].copy()
+    return block.mean(axis=1, dtype=np.float32)
+
+class StreamingResampler:
+    """Polyphase FIR resampler that converts audio block by block"""
+
+    def __init__(self, in_rate, out_rate, zero_crossings=10, beta=8.0):
+        self.in_rate = int(in_rate)
+        self.out_rate = int(out_rate)
+
+        divisor = gcd(self.in_rate, self.out_rate)
+        self.up = self.out_rate // divisor
+        self.down = self.in_rate // divisor
+        self.passthrough = self.up == self.down
+
+        if self.passthrough:
+            return
+
+        # Windowed-sinc lowpass at the lower of the two Nyquist rates
+        factor = max(self.up, self.down)
+        num_taps = 2 * zero_crossings * factor + 1
+        cutoff = 0.5 / factor
+        t = np.arange(num_taps) - (num_taps - 1) / 2
+        h = 2 * cutoff * np.sinc(2 * cutoff * t) * np.kaiser(num_taps, beta)
+        h *= self.up / h.sum()
+
+        # Split into one sub-filter per output phase, shape (up, taps_per_phase)
+        self.taps = -(-num_taps // self.up)
+        h = np.pad(h, (0, self.taps * self.up - num_taps))
+        self.phases = h.reshape(self.taps, self.up).T.astype(np.float32)
+        self._offsets = np.arange(self.taps)
+
+        self.reset()
+
+    def reset(self):
+        """Clear filter history to start a new stream"""
+        if self.passthrough:
+            return
+        self._history = np.zeros(self.taps - 1, dtype=np.float32)
+        self._consumed = 0
+        self._next_output = 0
+
+    def process(self, block):
+        """Resample a mono block, returning every output sample it completes"""
+        block = np.asarray(block, dtype=np.float32)
+        if self.passthrough:
+            return block
+
+        buffer = np.concatenate((self._history, block))
+        buffer_start = self._consumed - len(self._history)
+        available = self._consumed + len(block)
+
+        # Output n needs input up to floor(n * down / up)
+        end = -(-available * self.up // self.down)
+        n = np.arange(self._next_output, end, dtype=np.int64)
+        position = n * self.down
+        base = position // self.up - buffer_start
+        phase = position % self.up
+
+        # Gather all input windows at once and apply each output's sub-filter
+        windows = buffer[base[:, None] - self._offsets[None, :]]
+        output = np.einsum('ij,ij->i', windows, self.phases[phase])
+
+        self._next_output = end
+        self._consumed = available
+        self._history = buffer[len(buffer) - (self.taps - 1):]
+
+        return output.astype(np.float32)
+
+def resample(audio, in_rate, out_rate):
+    """Resample a whole mono array"""
+    return StreamingResampler(in_rate, out_rate).process(audio)
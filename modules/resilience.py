@@ -0,0 +1,255 @@
+import time
+import random
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+logger = logging.getLogger('voice_assistant')
+
+class CircuitOpenError(Exception):
+    """Raised when the circuit breaker is rejecting calls"""
+
+class WorkersBusyError(TimeoutError):
+    """Raised when no worker became free before the deadline, the service was never called"""
+
+class TokenBucket:
+    """Token bucket rate limiter, rate tokens per second up to capacity"""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, timeout=None):
+        """Take a token, waiting up to timeout seconds. Returns False on timeout."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return True
+                wait_time = (1 - self.tokens) / self.rate
+
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                wait_time = min(wait_time, remaining)
+            time.sleep(wait_time)
+
+class CircuitBreaker:
+    """Opens after repeated failures, then lets one trial call through after a cool-down"""
+
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0
+        self.trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """Whether a call may be made now"""
+        with self._lock:
+            if self.state == "open":
+                if time.monotonic() - self.opened_at < self.reset_timeout:
+                    return False
+                self._set_state("half_open")
+
+            if self.state == "half_open":
+                if self.trial_in_flight:
+                    return False
+                self.trial_in_flight = True
+
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.trial_in_flight = False
+            if self.state != "closed":
+                self._set_state("closed")
+
+    def release(self):
+        """Give back a half-open trial that never reached the service"""
+        with self._lock:
+            self.trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self.trial_in_flight = False
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+                if self.state != "open":
+                    self._set_state("open")
+
+    def _set_state(self, state):
+        logger.warning(f"Circuit breaker {self.state} -> {state}")
+        self.state = state
+
+class ResilientClient:
+    """Calls call(prompt, timeout) with a deadline, rate limit, retries, hedging and a breaker"""
+
+    def __init__(self, call, config, is_retryable=None, max_workers=4):
+        self.call = call
+        self.config = config
+        self.is_retryable = is_retryable or (lambda e: isinstance(e, (TimeoutError, ConnectionError)))
+        self.max_workers = max_workers
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="llm")
+        self.active = 0
+        # Calls still running after their attempt was given up on
+        self.stuck = 0
+        self._active_lock = threading.Lock()
+        self.limiter = TokenBucket(
+            config.get("format_rate_per_minute") / 60,
+            config.get("format_burst")
+        )
+        self.breaker = CircuitBreaker(
+            config.get("breaker_failure_threshold"),
+            config.get("breaker_reset_seconds")
+        )
+
+        # Recent successful latencies, used to pick the hedging delay
+        self.latencies = deque(maxlen=50)
+
+    def generate(self, prompt):
+        """Call the service, raising TimeoutError, CircuitOpenError or the last error"""
+        deadline = time.monotonic() + self.config.get("format_timeout")
+        max_retries = self.config.get("format_max_retries")
+        attempt = 0
+
+        while True:
+            if not self.limiter.acquire(timeout=deadline - time.monotonic()):
+                raise TimeoutError("Rate limit wait exceeded the formatting deadline")
+            if not self.breaker.allow():
+                raise CircuitOpenError("Formatting service is unavailable")
+
+            try:
+                result = self._attempt(prompt, self.config.get("format_attempt_timeout"), deadline)
+                self.breaker.record_success()
+                return result
+            except WorkersBusyError:
+                if self.stuck:
+                    # Workers are held by calls the service never answered
+                    self.breaker.record_failure()
+                else:
+                    # Busy with live calls, the service was not asked
+                    self.breaker.release()
+                raise
+            except Exception as e:
+                if not self.is_retryable(e):
+                    # The service answered, so it is healthy, the request was bad
+                    self.breaker.record_success()
+                    raise
+                self.breaker.record_failure()
+
+                attempt += 1
+                if attempt > max_retries:
+                    raise
+
+                # Full jitter exponential backoff, bounded by the deadline
+                delay = random.uniform(0, min(4.0, 0.25 * 2 ** attempt))
+                if time.monotonic() + delay >= deadline:
+                    raise
+                logger.warning(f"Formatting attempt {attempt} failed ({e}), retrying in {delay:.2f}s")
+                time.sleep(delay)
+
+    def _attempt(self, prompt, attempt_timeout, deadline):
+        """One attempt, plus a hedged duplicate if the first is slow
+
+        The attempt clock starts when a worker picks the call up, so time
+        spent queued behind other calls is not charged to the service. When
+        the attempt ends, calls that have not started are cancelled, and
+        none can start afterwards.
+        """
+        if self.stuck >= self.max_workers:
+            raise WorkersBusyError("Every formatting worker is stuck on an unanswered call")
+
+        abandoned = threading.Event()
+        running = threading.Event()
+        pending = {self._submit(prompt, min(attempt_timeout, deadline - time.monotonic()), abandoned, running)}
+        try:
+            if not running.wait(timeout=max(0, deadline - time.monotonic())):
+                raise WorkersBusyError("No formatting worker became free before the deadline")
+
+            started = time.monotonic()
+            attempt_deadline = min(deadline, started + attempt_timeout)
+            hedge_at = started + self._hedge_delay() if self.config.get("format_hedge") else None
+            error = None
+
+            while pending:
+                now = time.monotonic()
+                if now >= attempt_deadline:
+                    break
+
+                wake = attempt_deadline if hedge_at is None else min(attempt_deadline, hedge_at)
+                done, pending = wait(pending, timeout=max(0, wake - now), return_when=FIRST_COMPLETED)
+
+                for future in done:
+                    if future.exception() is None:
+                        self.latencies.append(time.monotonic() - started)
+                        return future.result()
+                    error = future.exception()
+
+                if hedge_at is not None and pending and time.monotonic() >= hedge_at:
+                    hedge_at = None
+                    # Only hedge onto an idle worker, and within the rate limit
+                    if self.active < self.max_workers and self.limiter.acquire(timeout=0):
+                        logger.info("Formatting request is slow, sending a hedged duplicate")
+                        pending.add(self._submit(prompt, attempt_deadline - time.monotonic(), abandoned))
+
+            if error is not None and not pending:
+                raise error
+            raise TimeoutError(f"No formatting response within {attempt_timeout:.1f}s")
+        finally:
+            abandoned.set()
+            for future in pending:
+                if not future.cancel():
+                    self._mark_stuck(future)
+
+    def _submit(self, prompt, timeout, abandoned, running=None):
+        """Queue one call, tracking how many workers are busy"""
+        with self._active_lock:
+            self.active += 1
+        future = self.executor.submit(self._run, prompt, timeout, abandoned, running)
+        future.add_done_callback(self._on_done)
+        return future
+
+    def _run(self, prompt, timeout, abandoned, running):
+        """Worker body, skips calls whose attempt was given up while they were queued"""
+        if abandoned.is_set():
+            raise TimeoutError("Formatting attempt abandoned before it started")
+        if running is not None:
+            running.set()
+        return self.call(prompt, timeout)
+
+    def _on_done(self, future):
+        with self._active_lock:
+            self.active -= 1
+
+    def _mark_stuck(self, future):
+        """Count a running call that was given up on until it finally returns"""
+        with self._active_lock:
+            self.stuck += 1
+        future.add_done_callback(self._on_stuck_done)
+
+    def _on_stuck_done(self, future):
+        with self._active_lock:
+            self.stuck -= 1
+
+    def _hedge_delay(self):
+        """Delay before hedging, the p95 of recent latencies"""
+        min_delay = self.config.get("format_hedge_min_delay")
+        if len(self.latencies) < 10:
+            return min_delay * 2
+        ordered = sorted(self.latencies)
+        p95 = ordered[int(0.95 * (len(ordered) - 1))]
+        return max(min_delay, p95)
@@ -0,0 +1,101 @@
+import time
+import queue
+import logging
+import threading
+from concurrent.futures import Future
+
+logger = logging.getLogger('voice_assistant')
+
+class TranscriptionScheduler:
+    """Class to queue transcription requests from many clients onto one model"""
+
+    def __init__(self, transcriber, max_pending=32, max_batch_size=8, batch_window_ms=50):
+        self.transcriber = transcriber
+        self.queue = queue.Queue(maxsize=max_pending)
+        self.max_batch_size = max_batch_size
+        self.batch_window = batch_window_ms / 1000
+        self.worker_thread = None
+
+    def start(self):
+        """Start the worker thread that owns the model"""
+        if self.worker_thread is None:
+            self.worker_thread = threading.Thread(target=self._worker)
+            self.worker_thread.daemon = True
+            self.worker_thread.start()
+
+    def submit(self, audio):
+        """Queue audio (a 16 kHz array or file path) and return a Future
+
+        Raises queue.Full when too many requests are already pending.
+        """
+        future = Future()
+        self.queue.put_nowait((audio, future))
+        return future
+
+    def pending(self):
+        """Number of requests waiting for the model"""
+        return self.queue.qsize()
+
+    def _worker(self):
+        """Collect queued requests into batches and run them on the shared model"""
+        while True:
+            batch, stopping = self._collect_batch()
+
+            # Drop requests cancelled while they were waiting
+            batch = [job for job in batch if job[1].set_running_or_notify_cancel()]
+            if batch:
+                self._run(batch)
+
+            if stopping:
+                break
+
+    def _collect_batch(self):
+        """Wait for one request, then gather more until the window or size limit"""
+        job = self.queue.get()
+        if job is None:
+            return [], True
+
+        batch = [job]
+        deadline = time.monotonic() + self.batch_window
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                job = self.queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if job is None:
+                return batch, True
+            batch.append(job)
+
+        return batch, False
+
+    def _run(self, batch):
+        """Transcribe a batch and route each result to its Future"""
+        try:
+            if len(batch) == 1:
+                results = [self._transcribe_one(batch[0][0])]
+            else:
+                results = self.transcriber.transcribe_batch([audio for audio, _ in batch])
+        except Exception as e:
+            results = [("", str(e))] * len(batch)
+
+        for (_, future), (text, error) in zip(batch, results):
+            if error:
+                future.set_exception(RuntimeError(error))
+            else:
+                future.set_result(text)
+
+    def _transcribe_one(self, audio):
+        """Transcribe a single request, returns (text, error)"""
+        result = []
+        self.transcriber.transcribe(audio, lambda text, error: result.append((text, error)))
+        return result[0] if result else ("", "Transcription failed")
+
+    def stop(self):
+        """Stop the worker after the queued requests finish"""
+        if self.worker_thread:
+            self.queue.put(None)
+            self.worker_thread.join()
+            self.worker_thread = None
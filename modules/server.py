@@ -0,0 +1,235 @@
+import io
+import json
+import queue
+import asyncio
+import logging
+import numpy as np
+from aiohttp import web, WSMsgType
+from modules.resample import StreamingResampler, downmix, resample
+from modules.scheduler import TranscriptionScheduler
+
+logger = logging.getLogger('voice_assistant')
+
+SAMPLE_RATE = 16000
+MAX_SAMPLE_RATE = 384000
+
+def decode_audio(data):
+    """Decode an uploaded audio file to a 16 kHz mono float32 array"""
+    import soundfile as sf
+    audio, file_rate = sf.read(io.BytesIO(data), dtype='float32', always_2d=True)
+    return resample(downmix(audio), file_rate, SAMPLE_RATE)
+
+def valid_sample_rate(sample_rate):
+    """Whether a client-supplied sample rate is a usable positive integer"""
+    return (
+        isinstance(sample_rate, int)
+        and not isinstance(sample_rate, bool)
+        and 0 < sample_rate <= MAX_SAMPLE_RATE
+    )
+
+class DictationServer:
+    """Headless HTTP/WebSocket server sharing one warm model across clients
+
+    HTTP:
+        POST /transcribe?format_mode=email&format=1  body: audio file bytes
+        GET  /health
+
+    WebSocket /stream:
+        {"type": "start", "sample_rate": 48000, "format_mode": "email"}
+        binary messages of little-endian float32 mono PCM
+        {"type": "stop"}  ->  {"type": "transcript", ...}, {"type": "formatted", ...}
+    """
+
+    def __init__(self, config, transcriber, formatter, vocabulary=None):
+        self.config = config
+        self.transcriber = transcriber
+        self.formatter = formatter
+        self.vocabulary = vocabulary
+        self.host = config.get("server_host")
+        self.port = config.get("server_port")
+        self.scheduler = TranscriptionScheduler(
+            transcriber,
+            max_pending=config.get("server_max_pending"),
+            max_batch_size=config.get("max_batch_size"),
+            batch_window_ms=config.get("batch_window_ms")
+        )
+
+        self.app = web.Application(client_max_size=config.get("server_max_upload_mb") * 1024 * 1024)
+        self.app.add_routes([
+            web.get("/health", self.handle_health),
+            web.post("/transcribe", self.handle_transcribe),
+            web.get("/stream", self.handle_stream)
+        ])
+        self.app.on_startup.append(self._on_startup)
+        self.app.on_cleanup.append(self._on_cleanup)
+
+    async def _on_startup(self, app):
+        self.scheduler.start()
+
+    async def _on_cleanup(self, app):
+        await asyncio.get_running_loop().run_in_executor(None, self.scheduler.stop)
+
+    def run(self):
+        """Run the server until interrupted"""
+        logger.info(f"Dictation server listening on {self.host}:{self.port}")
+        web.run_app(self.app, host=self.host, port=self.port, print=None)
+
+    async def transcribe(self, audio):
+        """Queue audio on the shared model and wait for the transcript"""
+        text = await asyncio.wrap_future(self.scheduler.submit(audio))
+        if self.vocabulary:
+            text = self.vocabulary.apply(text)
+        return text
+
+    async def format(self, text, format_mode=None):
+        """Format text with the shared formatter, returns (text, error)"""
+        loop = asyncio.get_running_loop()
+        result = loop.create_future()
+
+        def on_complete(formatted_text, error):
+            loop.call_soon_threadsafe(
+                lambda: result.done() or result.set_result((formatted_text, error))
+            )
+
+        self.formatter.format_text(text, on_complete, format_mode=format_mode)
+        return await result
+
+    async def process(self, audio, format_mode=None, do_format=True):
+        """Transcribe and optionally format audio, returning a response dict"""
+        text = await self.transcribe(audio)
+        response = {"text": text, "formatted": None, "error": None}
+
+        if do_format and text:
+            formatted_text, error = await self.format(text, format_mode)
+            response["formatted"] = formatted_text
+            response["error"] = error
+
+        return response
+
+    async def handle_health(self, request):
+        return web.json_response({
+            "model_loaded": self.transcriber.model_loaded,
+            "model_state": self.transcriber.lifecycle.state,
+            "pending": self.scheduler.pending(),
+            "escalation_rate": self.transcriber.escalation_rate()
+        })
+
+    async def handle_transcribe(self, request):
+        """Transcribe a whole uploaded audio file"""
+        data = await request.read()
+        if not data:
+            return web.json_response({"error": "Empty request body"}, status=400)
+
+        try:
+            loop = asyncio.get_running_loop()
+            audio = await loop.run_in_executor(None, decode_audio, data)
+        except Exception as e:
+            return web.json_response({"error": f"Could not decode audio: {e}"}, status=400)
+
+        try:
+            response = await self.process(
+                audio,
+                format_mode=request.query.get("format_mode"),
+                do_format=request.query.get("format", "1") != "0"
+            )
+        except queue.Full:
+            return web.json_response({"error": "Server busy"}, status=503)
+        except Exception as e:
+            logger.error(f"Error processing request: {e}")
+            return web.json_response({"error": str(e)}, status=500)
+
+        return web.json_response(response)
+
+    async def handle_stream(self, request):
+        """Receive streamed PCM over a WebSocket, one utterance per start/stop"""
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+
+        blocks = []
+        received = 0
+        overflowed = False
+        max_bytes = self.config.get("server_max_upload_mb") * 1024 * 1024
+        resampler = StreamingResampler(SAMPLE_RATE, SAMPLE_RATE)
+        format_mode = None
+        do_format = True
+
+        async for msg in ws:
+            if msg.type == WSMsgType.BINARY:
+                if len(msg.data) % 4:
+                    await ws.send_json({"type": "error", "error": "Binary frames must hold whole float32 samples"})
+                    continue
+                if overflowed:
+                    continue
+
+                # Same cap as uploads, the rest of the utterance is dropped
+                received += len(msg.data)
+                if received > max_bytes:
+                    overflowed = True
+                    blocks = []
+                    await ws.send_json({
+                        "type": "error",
+                        "error": f"Utterance exceeds {self.config.get('server_max_upload_mb')} MB"
+                    })
+                    continue
+
+                blocks.append(resampler.process(np.frombuffer(msg.data, dtype='<f4')))
+
+            elif msg.type == WSMsgType.TEXT:
+                try:
+                    message = json.loads(msg.data)
+                except ValueError:
+                    message = None
+                if not isinstance(message, dict):
+                    await ws.send_json({"type": "error", "error": "Invalid JSON"})
+                    continue
+
+                if message.get("type") == "start":
+                    sample_rate = message.get("sample_rate", SAMPLE_RATE)
+                    if not valid_sample_rate(sample_rate):
+                        await ws.send_json({"type": "error", "error": f"Invalid sample_rate: {sample_rate!r}"})
+                        continue
+
+                    self.transcriber.prewarm()
+                    blocks = []
+                    received = 0
+                    overflowed = False
+                    resampler = StreamingResampler(sample_rate, SAMPLE_RATE)
+                    format_mode = message.get("format_mode")
+                    # Like format=0 on uploads
+                    do_format = message.get("format", True) not in (False, 0, "0")
+
+                elif message.get("type") == "stop":
+                    audio = np.concatenate(blocks) if blocks else np.zeros(0, dtype=np.float32)
+                    blocks = []
+                    received = 0
+                    if overflowed:
+                        # Already reported
+                        overflowed = False
+                        continue
+                    await self._respond_stream(ws, audio, format_mode, do_format)
+
+            elif msg.type == WSMsgType.ERROR:
+                logger.error(f"WebSocket error: {ws.exception()}")
+
+        return ws
+
+    async def _respond_stream(self, ws, audio, format_mode, do_format):
+        """Send the transcript, then the formatted text, for one utterance"""
+        if not len(audio):
+            await ws.send_json({"type": "error", "error": "No audio received"})
+            return
+
+        try:
+            text = await self.transcribe(audio)
+        except queue.Full:
+            await ws.send_json({"type": "error", "error": "Server busy"})
+            return
+        except Exception as e:
+            await ws.send_json({"type": "error", "error": str(e)})
+            return
+
+        await ws.send_json({"type": "transcript", "text": text})
+
+        if do_format and text:
+            formatted_text, error = await self.format(text, format_mode)
+            await ws.send_json({"type": "formatted", "text": formatted_text, "error": error})
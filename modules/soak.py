@@ -0,0 +1,282 @@
+import os
+import gc
+import time
+import shutil
+import logging
+import tempfile
+import threading
+import statistics
+import numpy as np
+from modules.capture import FileSource, GeneratorSource
+from modules.record import AudioRecorder
+from modules.transcribe import Transcriber
+from modules.format import TextFormatter
+from modules.fake_gemini import FakeGeminiServer
+
+logger = logging.getLogger('voice_assistant')
+
+class NullInjector:
+    """Injector that skips typing but keeps the thread per call, like TextInjector"""
+
+    def inject_text(self, text, callback=None):
+        thread = threading.Thread(target=self._inject_text_thread, args=(text, callback))
+        thread.daemon = True
+        thread.start()
+
+    def _inject_text_thread(self, text, callback):
+        if callback:
+            callback(bool(text), None if text else "Empty text provided")
+
+def process_stats():
+    """RSS in MB, live thread count and open file handles for this process"""
+    rss_mb, open_files = None, None
+    try:
+        import psutil
+        process = psutil.Process()
+        rss_mb = process.memory_info().rss / 2 ** 20
+        open_files = process.num_fds() if hasattr(process, "num_fds") else process.num_handles()
+    except ImportError:
+        # Linux without psutil
+        try:
+            with open("/proc/self/statm") as f:
+                rss_mb = int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+            open_files = len(os.listdir("/proc/self/fd"))
+        except (OSError, ValueError, AttributeError):
+            pass
+
+    stats = {"rss_mb": rss_mb, "threads": threading.active_count(), "open_files": open_files}
+
+    # Memory held by torch on the GPU, if it is in use
+    try:
+        import torch
+        if torch.cuda.is_available():
+            stats["cuda_mb"] = torch.cuda.memory_allocated() / 2 ** 20
+    except ImportError:
+        pass
+    return stats
+
+def synthetic_blocks(sample_rate, seconds=2.0, block_size=1024):
+    """A few seconds of tones over noise, for machines without recordings"""
+    t = np.arange(int(sample_rate * seconds)) / sample_rate
+    rng = np.random.default_rng(0)
+    audio = 0.2 * np.sin(2 * np.pi * (220 + 60 * np.sin(2 * np.pi * 1.5 * t)) * t)
+    audio += 0.01 * rng.standard_normal(len(t))
+    audio = audio.astype(np.float32)
+    return [audio[start:start + block_size] for start in range(0, len(audio), block_size)]
+
+class SoakRunner:
+    """Replays audio through the real recorder, transcriber and formatter many times
+
+    Dictations start at a fixed rate (or back to back) and run through the
+    same callbacks and threads as the UI, with a fake Gemini server and an
+    injector that doesn't type. Process stats are sampled as it goes, and
+    growth after warm-up is checked against thresholds at the end.
+    """
+
+    def __init__(self, config, audio_path=None, iterations=1000, rate_per_minute=0,
+                 max_in_flight=4, realtime=False, format_latency_ms=50,
+                 sample_every=50, warmup=20, thresholds=None):
+        self.config = config
+        self.audio_path = audio_path
+        self.iterations = iterations
+        self.interval = 60 / rate_per_minute if rate_per_minute else 0
+        self.realtime = realtime
+        self.sample_every = sample_every
+        self.warmup = min(warmup, max(0, iterations - 1))
+        self.thresholds = {
+            "rss_mb": 150,
+            "threads": 8,
+            "open_files": 16,
+            "latency_drift": 1.5,
+            **(thresholds or {})
+        }
+
+        self.server = FakeGeminiServer(format_latency_ms)
+        self.max_in_flight = max_in_flight
+        self.in_flight = threading.BoundedSemaphore(max_in_flight)
+        self.pending_recordings = []
+        self.latencies = []
+        self.errors = {}
+        self.samples = []
+        self._lock = threading.Lock()
+
+    def _setup(self):
+        """Start the fake server and build the pipeline against it"""
+        self.server.start()
+        overrides = {
+            "gemini_api_endpoint": self.server.endpoint,
+            "format_rate_per_minute": 1_000_000,
+            "format_burst": 1_000_000,
+            "feedback_sounds": False,
+            "capture_mode": "on_demand",
+            "handsfree_enabled": False
+        }
+        for key, value in overrides.items():
+            self.config.set(key, value, persist=False)
+
+        sample_rate = self.config.get("sample_rate")
+        if self.audio_path:
+            source = FileSource(self.audio_path, sample_rate, realtime=self.realtime)
+            self.record_seconds = len(source.audio) / sample_rate if self.realtime else 0.2
+        else:
+            source = GeneratorSource(synthetic_blocks(sample_rate), sample_rate, realtime=self.realtime)
+            self.record_seconds = 2.0 if self.realtime else 0.2
+
+        self.recordings_dir = tempfile.mkdtemp(prefix="soak_")
+        self.recorder = AudioRecorder(self.config, source=source)
+        self.recorder.recordings_dir = self.recordings_dir
+        self.recorder.set_callback(self._on_recording_complete)
+        self.transcriber = Transcriber(self.config)
+        self.transcriber.ensure_model_loaded()
+        self.formatter = TextFormatter(self.config)
+        self.injector = NullInjector()
+
+    def _teardown(self):
+        self.recorder.close()
+        self.server.stop()
+        shutil.rmtree(self.recordings_dir, ignore_errors=True)
+
+    def run(self):
+        """Run every iteration, returns a report dict with a "passed" flag"""
+        self._setup()
+        try:
+            baseline = None
+            for iteration in range(self.iterations):
+                started = time.perf_counter()
+                self._dictate()
+
+                if iteration + 1 == self.warmup or (self.warmup == 0 and iteration == 0):
+                    self._drain()
+                    baseline = self._sample(iteration + 1)
+                elif (iteration + 1) % self.sample_every == 0 and iteration + 1 < self.iterations:
+                    self._sample(iteration + 1)
+
+                if self.interval:
+                    time.sleep(max(0, self.interval - (time.perf_counter() - started)))
+
+            self._drain()
+            final = self._sample(self.iterations)
+            return self._report(baseline or self.samples[0], final)
+        finally:
+            self._teardown()
+
+    def _dictate(self):
+        """Record one dictation, the rest of the pipeline continues in the background"""
+        self.in_flight.acquire()
+        started = time.perf_counter()
+        with self._lock:
+            self.pending_recordings.append(started)
+        self.recorder.start_recording()
+        time.sleep(self.record_seconds)
+        self.recorder.stop_recording()
+
+        # The recording is saved before stop_recording returns, nothing saved means no audio
+        with self._lock:
+            unsaved = started in self.pending_recordings
+            if unsaved:
+                self.pending_recordings.remove(started)
+        if unsaved:
+            self._finish(started, "record", "No audio recorded")
+
+    def _drain(self):
+        """Wait for every dictation in flight to finish"""
+        for _ in range(self.max_in_flight):
+            self.in_flight.acquire()
+        for _ in range(self.max_in_flight):
+            self.in_flight.release()
+
+    def _on_recording_complete(self, audio_file):
+        with self._lock:
+            started = self.pending_recordings.pop(0)
+        threading.Thread(
+            target=self._transcribe,
+            args=(audio_file, started),
+            daemon=True
+        ).start()
+
+    def _transcribe(self, audio_file, started):
+        def on_transcribed(text, error):
+            os.remove(audio_file)
+            if error:
+                self._finish(started, "transcribe", error)
+                return
+            # Silence or noise can transcribe to nothing, keep the formatter busy anyway
+            self.formatter.format_text(
+                text or "soak test dictation",
+                lambda formatted_text, error: self._on_formatted(started, formatted_text, error)
+            )
+
+        self.transcriber.transcribe(audio_file, on_transcribed)
+
+    def _on_formatted(self, started, formatted_text, error):
+        if error:
+            self._count_error("format", error)
+        self.injector.inject_text(
+            formatted_text,
+            lambda success, error: self._finish(started, "inject", error)
+        )
+
+    def _finish(self, started, stage, error):
+        if error:
+            self._count_error(stage, error)
+        with self._lock:
+            self.latencies.append(time.perf_counter() - started)
+        self.in_flight.release()
+
+    def _count_error(self, stage, error):
+        with self._lock:
+            self.errors[stage] = self.errors.get(stage, 0) + 1
+        logger.warning(f"Soak {stage} error: {error}")
+
+    def _sample(self, iteration):
+        gc.collect()
+        stats = process_stats()
+        stats["iteration"] = iteration
+        with self._lock:
+            recent = self.latencies[-self.sample_every:]
+        stats["latency_ms"] = 1000 * statistics.median(recent) if recent else None
+        self.samples.append(stats)
+
+        rss = f"{stats['rss_mb']:.0f} MB" if stats["rss_mb"] is not None else "n/a"
+        latency = f"{stats['latency_ms']:.0f} ms" if stats["latency_ms"] is not None else "n/a"
+        logger.info(
+            f"Soak {iteration}/{self.iterations}: rss={rss} threads={stats['threads']} "
+            f"open_files={stats['open_files']} median_latency={latency}"
+        )
+        return stats
+
+    def _report(self, baseline, final):
+        """Compare the final sample with the post-warm-up baseline"""
+        failures = []
+        growth = {}
+        for key in ("rss_mb", "threads", "open_files"):
+            if baseline.get(key) is None or final.get(key) is None:
+                continue
+            growth[key] = final[key] - baseline[key]
+            if growth[key] > self.thresholds[key]:
+                failures.append(f"{key} grew by {growth[key]:.1f} (limit {self.thresholds[key]})")
+
+        # Latency drift, median of the first window after warm-up vs the last one
+        window = self.sample_every
+        measured = self.latencies[self.warmup:]
+        drift = None
+        if len(measured) >= 2 * window:
+            first = statistics.median(measured[:window])
+            last = statistics.median(measured[-window:])
+            drift = last / first if first else None
+            if drift and drift > self.thresholds["latency_drift"]:
+                failures.append(f"latency drifted {drift:.2f}x (limit {self.thresholds['latency_drift']}x)")
+
+        return {
+            "passed": not failures,
+            "failures": failures,
+            "iterations": self.iterations,
+            "completed": len(self.latencies),
+            "errors": dict(self.errors),
+            "format_requests": self.server.requests,
+            "baseline": baseline,
+            "final": final,
+            "growth": growth,
+            "latency_drift": drift,
+            "samples": self.samples
+        }
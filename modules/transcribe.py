@@ -1,11 +1,50 @@
 import os
+import gc
+import time
 import logging
 import threading
+import numpy as np
 import whisper
 import torch
+from modules.resample import downmix, resample
+from modules.logger import stage_extra
+from modules.lifecycle import ModelLifecycle
+from modules.profiling import profile_stage
 
 logger = logging.getLogger('voice_assistant')
 
+# Whisper decoding settings by latency profile. Beam search only applies to
+# temperature 0 and best_of only to sampled fallbacks.
+DECODING_PROFILES = {
+    "fast": {
+        "beam_size": None,
+        "best_of": None,
+        "temperature": 0.0,
+        "condition_on_previous_text": False,
+        "compression_ratio_threshold": 2.4,
+        "logprob_threshold": -1.0,
+        "no_speech_threshold": 0.6
+    },
+    "balanced": {
+        "beam_size": None,
+        "best_of": 2,
+        "temperature": (0.0, 0.4, 0.8),
+        "condition_on_previous_text": False,
+        "compression_ratio_threshold": 2.4,
+        "logprob_threshold": -1.0,
+        "no_speech_threshold": 0.6
+    },
+    "accurate": {
+        "beam_size": 5,
+        "best_of": 5,
+        "temperature": (0.0, 0.2, 0.4, 0.6, 0.8, 1.0),
+        "condition_on_previous_text": True,
+        "compression_ratio_threshold": 2.4,
+        "logprob_threshold": -1.0,
+        "no_speech_threshold": 0.6
+    }
+}
+
 class Transcriber:
     """Class to handle transcription using Whisper"""
     
@@ -17,8 +56,33 @@ class Transcriber:
         self.model_thread = None
         self.model_loaded = False
         
+        # Language detected on first use, reused to skip detection afterwards
+        self.session_language = None
+        
+        # Cascade mode: a small first-pass model, escalating to the main model
+        self.fast_model = None
+        self.fast_model_name = None
+        self.cascade_segments = 0
+        self.cascade_escalated = 0
+        
+        # Unloads the models after inactivity, reloads are started by prewarm()
+        self.lifecycle = ModelLifecycle(
+            "Whisper",
+            unload=self._unload_model,
+            idle_seconds=config.get("model_idle_unload_minutes") * 60
+        )
+        
         # Start loading the model in a separate thread
         self._load_model_async()
+        
+        # Apply model changes live instead of requiring a restart
+        config.subscribe(
+            self._on_config_changed,
+            keys=[
+                "whisper_model", "use_fp16", "language", "cache_language",
+                "cascade_enabled", "cascade_fast_model", "model_idle_unload_minutes"
+            ]
+        )
     
     def _load_model_async(self):
         """Load the Whisper model in a background thread"""
@@ -28,25 +92,98 @@ class Transcriber:
             self.model_thread.start()
     
     def _load_model(self):
-        """Load the Whisper model"""
+        """Load the Whisper model, plus the first-pass model in cascade mode"""
+        self.lifecycle.set_state("loading")
         try:
-            logger.info(f"Loading Whisper model: {self.model_name}")
-            
-            # Check GPU availability
-            device = "cuda" if torch.cuda.is_available() else "cpu"
-            logger.info(f"Using device: {device}")
-            
-            # Set fp16 to False for compatibility with 4GB VRAM
-            self.model = whisper.load_model(
-                self.model_name,
-                device=device,
-                download_root="models"
-            )
-            
-            self.model_loaded = True
+            self.model = self._load_whisper(self.model_name)
             logger.info("Whisper model loaded successfully")
         except Exception as e:
             logger.error(f"Error loading Whisper model: {e}")
+            self.lifecycle.set_state("unloaded" if self.model is None else "loaded")
+            return
+        
+        if self.config.get("cascade_enabled"):
+            self._load_fast_model()
+        
+        self.model_loaded = True
+        self.lifecycle.set_state("loaded")
+    
+    def _unload_model(self):
+        """Release the models and free torch memory"""
+        self.model_loaded = False
+        self.model = None
+        self.fast_model = None
+        self.fast_model_name = None
+        self.model_thread = None
+        
+        gc.collect()
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+    
+    def prewarm(self):
+        """Start loading the model if it was unloaded, e.g. when recording starts"""
+        if self.model_loaded:
+            return
+        if self.model_thread and self.model_thread.is_alive():
+            return
+        logger.info("Prewarming Whisper model")
+        self.model_thread = None
+        self._load_model_async()
+    
+    def _load_whisper(self, model_name):
+        """Load a Whisper model by name"""
+        logger.info(f"Loading Whisper model: {model_name}")
+        
+        # Check GPU availability
+        device = "cuda" if torch.cuda.is_available() else "cpu"
+        logger.info(f"Using device: {device}")
+        
+        return whisper.load_model(
+            model_name,
+            device=device,
+            download_root="models"
+        )
+    
+    def _load_fast_model(self):
+        """Load the cascade's first-pass model, kept resident alongside the main one"""
+        name = self.config.get("cascade_fast_model")
+        if self.fast_model is not None and self.fast_model_name == name:
+            return
+        try:
+            self.fast_model = self._load_whisper(name)
+            self.fast_model_name = name
+            logger.info(f"Cascade first-pass model loaded: {name}")
+        except Exception as e:
+            logger.error(f"Error loading cascade model {name}: {e}")
+    
+    def _on_config_changed(self, changes):
+        """Reconfigure when the model settings change"""
+        if "use_fp16" in changes:
+            self.use_fp16 = changes["use_fp16"]
+        
+        if "language" in changes or "cache_language" in changes:
+            self.session_language = None
+        
+        if "model_idle_unload_minutes" in changes:
+            self.lifecycle.set_idle_seconds(changes["model_idle_unload_minutes"] * 60)
+        
+        if "cascade_enabled" in changes or "cascade_fast_model" in changes:
+            if self.config.get("cascade_enabled"):
+                thread = threading.Thread(target=self._load_fast_model)
+                thread.daemon = True
+                thread.start()
+            else:
+                # Free the first-pass model
+                self.fast_model = None
+                self.fast_model_name = None
+        
+        if changes.get("whisper_model", self.model_name) != self.model_name:
+            self.model_name = changes["whisper_model"]
+            
+            # The current model keeps serving until the new one has loaded
+            self.model_thread = threading.Thread(target=self._load_model)
+            self.model_thread.daemon = True
+            self.model_thread.start()
     
     def ensure_model_loaded(self):
         """Ensure the model is loaded before transcription"""
@@ -57,9 +194,55 @@ class Transcriber:
             else:
                 self._load_model()
     
+    def _profile(self):
+        """Decoding settings for the configured latency profile"""
+        name = self.config.get("decoding_profile")
+        if name not in DECODING_PROFILES:
+            logger.warning(f"Unknown decoding profile {name}, using balanced")
+            name = "balanced"
+        return DECODING_PROFILES[name]
+    
+    def _language(self):
+        """Pinned language from config, else the language cached this session"""
+        return self.config.get("language") or self.session_language
+    
+    def _transcribe_options(self):
+        """Keyword arguments for model.transcribe"""
+        options = dict(self._profile())
+        options["fp16"] = self.use_fp16
+        
+        language = self._language()
+        if language:
+            options["language"] = language
+        return options
+    
+    def _remember_language(self, language):
+        """Cache the detected language so later calls skip detection"""
+        if language and not self._language() and self.config.get("cache_language"):
+            self.session_language = language
+            logger.info(f"Detected language cached for this session: {language}")
+    
+    def _load_audio(self, audio_file):
+        """Load audio as a 16 kHz mono array, skipping ffmpeg when possible"""
+        if isinstance(audio_file, np.ndarray):
+            return audio_file.astype(np.float32, copy=False)
+        
+        try:
+            import soundfile as sf
+            data, file_rate = sf.read(audio_file, dtype='float32', always_2d=True)
+            return resample(downmix(data), file_rate, whisper.audio.SAMPLE_RATE)
+        except Exception:
+            # Formats soundfile can't read are decoded by whisper via ffmpeg
+            return whisper.load_audio(audio_file)
+    
     def transcribe(self, audio_file, callback=None):
-        """Transcribe audio file using Whisper"""
-        if not os.path.exists(audio_file):
+        """Transcribe an audio file or 16 kHz mono array using Whisper"""
+        with self.lifecycle.in_use():
+            return self._transcribe(audio_file, callback)
+    
+    def _transcribe(self, audio_file, callback):
+        """Transcribe while the model is marked in use"""
+        if not isinstance(audio_file, np.ndarray) and not os.path.exists(audio_file):
             logger.error(f"Audio file not found: {audio_file}")
             if callback:
                 callback("", "Audio file not found")
@@ -69,19 +252,35 @@ class Transcriber:
             # Ensure model is loaded
             self.ensure_model_loaded()
             
-            logger.info(f"Transcribing: {audio_file}")
+            if isinstance(audio_file, np.ndarray):
+                job_id = None
+                logger.info(f"Transcribing: {len(audio_file)} samples")
+            else:
+                job_id = os.path.splitext(os.path.basename(audio_file))[0]
+                logger.info(f"Transcribing: {audio_file}")
+            started = time.perf_counter()
+            with profile_stage("load_audio"):
+                audio = self._load_audio(audio_file)
             
-            # Perform transcription with fp16=False for compatibility
-            result = self.model.transcribe(
-                audio_file,
-                fp16=self.use_fp16
-            )
+            # Perform transcription with the configured decoding profile
+            with profile_stage("transcribe"):
+                if self._cascade_active():
+                    result = self._transcribe_cascade(audio)
+                else:
+                    result = self.model.transcribe(audio, **self._transcribe_options())
+            self._remember_language(result.get("language"))
             
             # Extract transcribed text
             transcribed_text = result["text"].strip()
             
-            logger.info(f"Transcription complete: {len(transcribed_text)} chars")
-            logger.info(f"Transcribed text: {transcribed_text}")
+            logger.info(
+                f"Transcription complete: {len(transcribed_text)} chars",
+                extra=stage_extra("transcribe", started, job_id)
+            )
+            
+            # Transcripts can be sensitive, only log them when debugging
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(f"Transcribed text: {transcribed_text}")
             
             # Call the callback with the transcribed text
             if callback:
@@ -96,4 +295,171 @@ class Transcriber:
             if callback:
                 callback("", error_msg)
             
-            return ""
\ No newline at end of file
+            return ""
+    
+    def transcribe_batch(self, audio_files):
+        """Transcribe several recordings in one batched decode
+        
+        Returns a list of (text, error) tuples in the same order.
+        """
+        with self.lifecycle.in_use():
+            return self._transcribe_batch(audio_files)
+    
+    def _transcribe_batch(self, audio_files):
+        """Batch transcription while the model is marked in use"""
+        results = [None] * len(audio_files)
+        
+        self.ensure_model_loaded()
+        if self.model is None:
+            return [("", "Whisper model not loaded")] * len(audio_files)
+        
+        # Load every segment, short ones are padded into one 30 s mel window each
+        batch = []
+        for i, audio_file in enumerate(audio_files):
+            try:
+                audio = self._load_audio(audio_file)
+            except Exception as e:
+                results[i] = ("", f"Error loading audio: {e}")
+                continue
+            
+            if len(audio) > whisper.audio.N_SAMPLES:
+                # Longer than one window, needs the sliding-window transcribe
+                results[i] = self._transcribe_array(audio)
+            else:
+                batch.append((i, audio))
+        
+        started = time.perf_counter()
+        if batch:
+            logger.info(f"Batch transcribing {len(batch)} segments")
+            try:
+                decoded = self._decode_batch([audio for _, audio in batch])
+            except Exception as e:
+                error_msg = f"Error transcribing audio: {e}"
+                logger.error(error_msg)
+                decoded = [None] * len(batch)
+                for i, _ in batch:
+                    results[i] = ("", error_msg)
+            
+            profile = self._profile()
+            cascade = self._cascade_active()
+            escalated = 0
+            for (i, audio), result in zip(batch, decoded):
+                if result is None:
+                    continue
+                self._remember_language(result.language)
+                low_logprob = result.avg_logprob < profile["logprob_threshold"]
+                if result.no_speech_prob > profile["no_speech_threshold"] and low_logprob:
+                    results[i] = ("", None)
+                elif cascade and self._needs_escalation(
+                    result.avg_logprob, result.compression_ratio, result.no_speech_prob
+                ):
+                    # First-pass model wasn't confident, use the main model
+                    results[i] = self._transcribe_array(audio)
+                    escalated += 1
+                elif result.compression_ratio > profile["compression_ratio_threshold"] or low_logprob:
+                    # Low confidence, redo with the temperature fallback cascade
+                    results[i] = self._transcribe_array(audio)
+                else:
+                    results[i] = (result.text.strip(), None)
+            
+            if cascade:
+                self._record_cascade(len(batch), escalated)
+        
+        logger.info(
+            f"Batch transcription complete: {len(audio_files)} segments",
+            extra=stage_extra("transcribe_batch", started)
+        )
+        return results
+    
+    def _decode_batch(self, audios):
+        """Run the encoder and decoder once over a stack of padded segments"""
+        # In cascade mode the batch goes through the first-pass model
+        model = self.fast_model if self._cascade_active() else self.model
+        
+        mels = [
+            whisper.log_mel_spectrogram(
+                whisper.pad_or_trim(torch.from_numpy(audio)),
+                n_mels=model.dims.n_mels
+            )
+            for audio in audios
+        ]
+        mel = torch.stack(mels).to(model.device)
+        
+        # Batched decoding runs one pass at temperature 0, fallbacks go through _transcribe_array
+        profile = self._profile()
+        options = whisper.DecodingOptions(
+            language=self._language(),
+            beam_size=profile["beam_size"],
+            fp16=self.use_fp16 and model.device.type != "cpu",
+            without_timestamps=True
+        )
+        return whisper.decode(model, mel, options)
+    
+    def _transcribe_array(self, audio):
+        """Transcribe one array with the full transcribe loop, returns (text, error)"""
+        try:
+            result = self.model.transcribe(audio, **self._transcribe_options())
+            self._remember_language(result.get("language"))
+            return result["text"].strip(), None
+        except Exception as e:
+            error_msg = f"Error transcribing audio: {e}"
+            logger.error(error_msg)
+            return "", error_msg
+    
+    def _cascade_active(self):
+        """Whether transcription should go through the first-pass model"""
+        return self.config.get("cascade_enabled") and self.fast_model is not None
+    
+    def _needs_escalation(self, avg_logprob, compression_ratio, no_speech_prob):
+        """Whether a first-pass result is too uncertain to keep"""
+        return (
+            avg_logprob < self.config.get("cascade_logprob_threshold")
+            or compression_ratio > self.config.get("cascade_compression_threshold")
+            or no_speech_prob > self.config.get("cascade_no_speech_threshold")
+        )
+    
+    def _transcribe_cascade(self, audio):
+        """Transcribe with the fast model, re-running only uncertain segments on the main model"""
+        options = self._transcribe_options()
+        result = self.fast_model.transcribe(audio, **options)
+        segments = result["segments"]
+        
+        # Keep the detected language so escalations skip detection
+        if result.get("language"):
+            options["language"] = result["language"]
+        
+        escalated = 0
+        for segment in segments:
+            if not self._needs_escalation(
+                segment["avg_logprob"], segment["compression_ratio"], segment["no_speech_prob"]
+            ):
+                continue
+            
+            start = int(segment["start"] * whisper.audio.SAMPLE_RATE)
+            end = int(segment["end"] * whisper.audio.SAMPLE_RATE)
+            if end - start < whisper.audio.SAMPLE_RATE // 10:
+                continue
+            
+            retry = self.model.transcribe(audio[start:end], **options)
+            segment["text"] = retry["text"]
+            escalated += 1
+        
+        self._record_cascade(len(segments), escalated)
+        
+        text = "".join(segment["text"] for segment in segments)
+        return {"text": text, "segments": segments, "language": result.get("language")}
+    
+    def _record_cascade(self, segments, escalated):
+        """Update and report the escalation rate"""
+        self.cascade_segments += segments
+        self.cascade_escalated += escalated
+        logger.info(
+            f"Cascade escalated {escalated}/{segments} segments "
+            f"(session rate {self.escalation_rate():.0%})"
+        )
+    
+    def escalation_rate(self):
+        """Fraction of first-pass segments re-transcribed with the main model"""
+        if not self.cascade_segments:
+            return 0.0
+        return self.cascade_escalated / self.cascade_segments
\ No newline at end of file
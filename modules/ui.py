@@ -3,6 +3,8 @@ import tkinter as tk
 from tkinter import ttk, scrolledtext, messagebox, StringVar, BooleanVar
 import threading
 import logging
+from modules.dispatcher import UIDispatcher
+from modules.profiling import profile_stage
 
 logger = logging.getLogger('voice_assistant')
 
@@ -22,6 +24,9 @@ class VoiceAssistantUI:
         self.status_text = StringVar(value="Ready")
         self.format_mode = StringVar(value=config.get("format_mode"))
         
+        # Worker threads post UI updates here instead of touching widgets
+        self.dispatcher = UIDispatcher(root)
+        
         # Configure the root window
         self.setup_root()
         
@@ -30,6 +35,12 @@ class VoiceAssistantUI:
         
         # Apply styles
         self.apply_styles()
+        
+        # Reflect live config edits, delivered on the Tk thread
+        config.subscribe(
+            lambda changes: self.dispatcher.call(self.on_config_changed, changes),
+            keys=["format_mode", "hotkey"]
+        )
     
     def setup_root(self):
         """Configure the root window"""
@@ -77,7 +88,7 @@ class VoiceAssistantUI:
         format_combo = ttk.Combobox(
             format_frame,
             textvariable=self.format_mode,
-            values=["general", "email", "bullets"],
+            values=list(self.config.FORMAT_MODES),
             width=10,
             state="readonly"
         )
@@ -185,12 +196,12 @@ class VoiceAssistantUI:
         status_label.pack(side=tk.LEFT)
         
         # Hotkey info
-        hotkey_label = ttk.Label(
+        self.hotkey_label = ttk.Label(
             status_frame,
             text=f"Hotkey: {self.config.get('hotkey')}",
             font=("Segoe UI", 9)
         )
-        hotkey_label.pack(side=tk.RIGHT)
+        self.hotkey_label.pack(side=tk.RIGHT)
     
     def apply_styles(self):
         """Apply styles to the UI elements"""
@@ -216,16 +227,33 @@ class VoiceAssistantUI:
             background="#f5f5f5"
         )
     
-    def set_components(self, recorder, transcriber, formatter, injector):
+    def set_components(self, recorder, transcriber, formatter, injector, vocabulary=None):
         """Set the components used by the UI"""
         self.recorder = recorder
         self.transcriber = transcriber
         self.formatter = formatter
         self.injector = injector
+        self.vocabulary = vocabulary
         
         # Set callback for recorder
         self.recorder.set_callback(self.on_recording_complete)
     
+    def request_toggle(self):
+        """Toggle recording from any thread, e.g. the global hotkey hook"""
+        self.dispatcher.call(self.toggle_recording)
+    
+    def request_start(self, preroll=True):
+        """Start recording from any thread if not already recording"""
+        self.dispatcher.call(
+            lambda: self.is_recording.get() or self.start_recording(preroll)
+        )
+    
+    def request_stop(self):
+        """Stop recording from any thread if recording"""
+        self.dispatcher.call(
+            lambda: self.is_recording.get() and self.stop_recording()
+        )
+    
     def toggle_recording(self):
         """Toggle recording state"""
         if not self.is_recording.get():
@@ -235,7 +263,7 @@ class VoiceAssistantUI:
             # Stop recording
             self.stop_recording()
     
-    def start_recording(self):
+    def start_recording(self, preroll=True):
         """Start recording audio"""
         if not self.recorder:
             self.update_status("Error: Recorder not initialized", "red")
@@ -246,7 +274,11 @@ class VoiceAssistantUI:
         self.record_button.config(text="Stop Recording")
         
         # Start recording in a separate thread
-        self.recorder.start_recording()
+        self.recorder.start_recording(preroll)
+        
+        # Reload an idle-unloaded model while the user is speaking
+        if self.transcriber:
+            self.transcriber.prewarm()
     
     def stop_recording(self):
         """Stop recording audio"""
@@ -287,15 +319,27 @@ class VoiceAssistantUI:
             self.update_status(f"Transcription error: {error}", "red")
             return
         
+        # Apply custom vocabulary before formatting
+        if self.vocabulary:
+            with profile_stage("vocabulary"):
+                text = self.vocabulary.apply(text)
+        
         # Update transcribed text
-        self.transcribed_text.delete(1.0, tk.END)
-        self.transcribed_text.insert(tk.END, text)
+        self.dispatcher.set_text(self.transcribed_text, text)
         
         # Update UI
         self.update_status("Formatting...", "blue")
         
-        # Format the transcribed text
-        self.formatter.format_text(text, self.on_formatting_complete)
+        # Format the transcribed text, streaming partial output if supported
+        if getattr(self.formatter, "streaming", False):
+            self.dispatcher.set_text(self.formatted_text, "")
+            self.formatter.format_text(
+                text,
+                self.on_formatting_complete,
+                partial_callback=self.on_partial_formatting
+            )
+        else:
+            self.formatter.format_text(text, self.on_formatting_complete)
     
     def on_formatting_complete(self, formatted_text, error):
         """Callback when formatting is complete"""
@@ -305,8 +349,11 @@ class VoiceAssistantUI:
             self.update_status("Ready", "green")
         
         # Update formatted text
-        self.formatted_text.delete(1.0, tk.END)
-        self.formatted_text.insert(tk.END, formatted_text)
+        self.dispatcher.set_text(self.formatted_text, formatted_text)
+    
+    def on_partial_formatting(self, text):
+        """Append streamed formatted text as it is generated"""
+        self.dispatcher.append_text(self.formatted_text, text)
     
     def type_formatted_text(self):
         """Type the formatted text into the active application"""
@@ -334,7 +381,9 @@ class VoiceAssistantUI:
             self.update_status("Text injected successfully", "green")
             
             # Reset status after a delay
-            self.root.after(3000, lambda: self.update_status("Ready", "green"))
+            self.dispatcher.call(
+                self.root.after, 3000, lambda: self.update_status("Ready", "green")
+            )
     
     def on_format_changed(self, event):
         """Handle format mode change"""
@@ -342,19 +391,32 @@ class VoiceAssistantUI:
         self.config.set("format_mode", new_mode)
         logger.info(f"Format mode changed to: {new_mode}")
     
+    def on_config_changed(self, changes):
+        """Update widgets after a live config change"""
+        if "format_mode" in changes:
+            self.format_mode.set(changes["format_mode"])
+        if "hotkey" in changes:
+            self.hotkey_label.config(text=f"Hotkey: {changes['hotkey']}")
+    
     def clear_all(self):
         """Clear all text fields"""
-        self.transcribed_text.delete(1.0, tk.END)
-        self.formatted_text.delete(1.0, tk.END)
+        self.dispatcher.set_text(self.transcribed_text, "")
+        self.dispatcher.set_text(self.formatted_text, "")
         self.update_status("Ready", "green")
     
     def update_status(self, text, color):
-        """Update the status text and indicator"""
+        """Update the status text and indicator, safe from any thread"""
+        self.dispatcher.set_status(text, color)
+    
+    def _apply_status(self, text, color):
+        """Apply a status update on the Tk thread"""
         self.status_text.set(text)
         self.status_indicator.config(foreground=color)
     
     def start(self):
         """Start the application"""
+        self.dispatcher.start(self._apply_status)
+        
         # Update UI to initial state
         self.update_status("Ready", "green")
         
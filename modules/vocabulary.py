@@ -0,0 +1,253 @@
+import os
+import json
+import stat
+import hashlib
+import logging
+import tempfile
+import threading
+
+logger = logging.getLogger('voice_assistant')
+
+# Bump when the cached automaton layout changes
+CACHE_VERSION = 1
+
+class AhoCorasick:
+    """Aho-Corasick automaton over lowercased phrases
+
+    goto[node] maps a character to the next node, fail[node] is the longest
+    proper suffix that is also a trie node, output[node] is the index of the
+    phrase ending at node (or -1), and link[node] is the nearest node on the
+    fail chain with an output, so every match is found without walking
+    nodes that have none.
+    """
+
+    def __init__(self, goto, fail, output, link, lengths):
+        self.goto = goto
+        self.fail = fail
+        self.output = output
+        self.link = link
+        self.lengths = lengths
+
+    @classmethod
+    def build(cls, phrases):
+        goto = [{}]
+        output = [-1]
+        for index, phrase in enumerate(phrases):
+            node = 0
+            for char in phrase:
+                next_node = goto[node].get(char)
+                if next_node is None:
+                    next_node = len(goto)
+                    goto[node][char] = next_node
+                    goto.append({})
+                    output.append(-1)
+                node = next_node
+            output[node] = index
+
+        # Breadth-first, so a node's fail target is always finished first
+        fail = [0] * len(goto)
+        link = [-1] * len(goto)
+        queue = list(goto[0].values())
+        for node in queue:
+            for char, child in goto[node].items():
+                target = fail[node]
+                while target and char not in goto[target]:
+                    target = fail[target]
+                fail[child] = goto[target].get(char, 0)
+                link[child] = fail[child] if output[fail[child]] >= 0 else link[fail[child]]
+                queue.append(child)
+
+        return cls(goto, fail, output, link, [len(phrase) for phrase in phrases])
+
+    def matches(self, text):
+        """Yield (start, end, phrase_index) for every occurrence in text"""
+        goto, fail, output, link, lengths = self.goto, self.fail, self.output, self.link, self.lengths
+        node = 0
+        for position, char in enumerate(text):
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+
+            match = node if output[node] >= 0 else link[node]
+            while match > 0:
+                index = output[match]
+                yield position + 1 - lengths[index], position + 1, index
+                match = link[match]
+
+    def to_dict(self):
+        return {
+            "goto": self.goto,
+            "fail": self.fail,
+            "output": self.output,
+            "link": self.link,
+            "lengths": self.lengths
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["goto"], data["fail"], data["output"], data["link"], data["lengths"])
+
+def parse_rules(text):
+    """Parse 'phrase => replacement' lines, '#' starts a comment line
+
+    Phrases are matched case-insensitively on word boundaries. Later rules
+    override earlier ones for the same phrase.
+    """
+    rules = {}
+    for number, line in enumerate(text.splitlines(), 1):
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        if "=>" not in line:
+            logger.warning(f"Ignoring vocabulary line {number}, expected 'phrase => replacement'")
+            continue
+        phrase, replacement = (part.strip() for part in line.split("=>", 1))
+        if phrase:
+            rules[_lower(phrase)] = replacement
+    return rules
+
+def _lower(text):
+    """Lowercase without changing the length, so match offsets map back to text"""
+    lowered = text.lower()
+    if len(lowered) == len(text):
+        return lowered
+    return "".join(char if len(char.lower()) != 1 else char.lower() for char in text)
+
+def _is_word_char(char):
+    return char.isalnum() or char == "_"
+
+class Vocabulary:
+    """Applies user phrase expansions and misrecognition corrections to transcripts
+
+    Rules are read from the vocabulary file and compiled into an
+    Aho-Corasick automaton, which is cached on disk and only rebuilt when
+    the rules change. Applying them is a single pass over the text, however
+    many rules there are.
+    """
+
+    def __init__(self, config):
+        self.config = config
+        # (automaton, replacements), swapped as one so apply() never sees a mix
+        self.compiled = None
+        self._file_state = None
+        self._lock = threading.Lock()
+
+        self._load()
+        config.subscribe(lambda changes: self._load(), keys=["vocabulary_file", "vocabulary_cache"])
+
+    def _load(self):
+        """Load rules, reusing the cached automaton when the rules are unchanged"""
+        path = self.config.get("vocabulary_file")
+        with self._lock:
+            try:
+                if not path or not os.path.exists(path):
+                    self.compiled, self._file_state = None, None
+                    return
+
+                info = os.stat(path)
+                self._file_state = (path, info.st_mtime_ns, info.st_size)
+                with open(path, 'r', encoding='utf-8') as f:
+                    source = f.read()
+
+                digest = hashlib.sha256(f"{CACHE_VERSION}\n{source}".encode('utf-8')).hexdigest()
+                cached = self._read_cache(digest)
+                if cached is not None:
+                    self.compiled = cached
+                    logger.info(f"Loaded {len(cached[1])} vocabulary rules from cache")
+                    return
+
+                rules = parse_rules(source)
+                phrases = list(rules)
+                self.compiled = (AhoCorasick.build(phrases), [rules[phrase] for phrase in phrases])
+                self._write_cache(digest)
+                logger.info(f"Compiled {len(phrases)} vocabulary rules")
+            except Exception as e:
+                logger.error(f"Error loading vocabulary: {e}")
+                self.compiled = None
+
+    def _read_cache(self, digest):
+        cache_path = self.config.get("vocabulary_cache")
+        try:
+            with open(cache_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get("digest") != digest:
+                return None
+            return AhoCorasick.from_dict(data["automaton"]), data["replacements"]
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+    def _write_cache(self, digest):
+        """Atomically write the compiled automaton next to other caches"""
+        cache_path = self.config.get("vocabulary_cache")
+        directory = os.path.dirname(os.path.abspath(cache_path))
+        temp_path = None
+        try:
+            os.makedirs(directory, exist_ok=True)
+            with tempfile.NamedTemporaryFile(
+                'w', dir=directory, prefix=".vocabulary.", suffix=".tmp", delete=False, encoding='utf-8'
+            ) as f:
+                temp_path = f.name
+                automaton, replacements = self.compiled
+                json.dump({
+                    "digest": digest,
+                    "automaton": automaton.to_dict(),
+                    "replacements": replacements
+                }, f, separators=(",", ":"))
+
+            # Temp files are created 0600, keep the existing cache's permissions
+            if os.path.exists(cache_path):
+                os.chmod(temp_path, stat.S_IMODE(os.stat(cache_path).st_mode))
+            os.replace(temp_path, cache_path)
+        except OSError as e:
+            logger.warning(f"Could not cache vocabulary: {e}")
+            if temp_path and os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def _reload_if_changed(self):
+        """Pick up edits to the rules file, a stat per call"""
+        path = self.config.get("vocabulary_file")
+        try:
+            info = os.stat(path) if path else None
+        except OSError:
+            info = None
+        state = (path, info.st_mtime_ns, info.st_size) if info else None
+        if state != self._file_state:
+            self._load()
+
+    def apply(self, text):
+        """Return text with every rule applied, leftmost-longest and non-overlapping"""
+        if not text:
+            return text
+        self._reload_if_changed()
+        if self.compiled is None:
+            return text
+        automaton, replacements = self.compiled
+
+        # Longest whole-word match starting at each position
+        longest = {}
+        for start, end, index in automaton.matches(_lower(text)):
+            if start > 0 and _is_word_char(text[start - 1]) and _is_word_char(text[start]):
+                continue
+            if end < len(text) and _is_word_char(text[end]) and _is_word_char(text[end - 1]):
+                continue
+            if end > longest.get(start, (0, -1))[0]:
+                longest[start] = (end, index)
+
+        if not longest:
+            return text
+
+        parts = []
+        position = 0
+        for start in sorted(longest):
+            if start < position:
+                continue
+            end, index = longest[start]
+            replacement = replacements[index]
+            # Keep sentence capitalisation, e.g. "Brb" -> "Be right back"
+            if text[start].isupper() and replacement[:1].islower():
+                replacement = replacement[0].upper() + replacement[1:]
+            parts.append(text[position:start])
+            parts.append(replacement)
+            position = end
+        parts.append(text[position:])
+        return "".join(parts)
@@ -0,0 +1,387 @@
+import os
+import json
+import time
+import queue
+import logging
+import threading
+from collections import deque
+import numpy as np
+from modules.capture import FileSource
+
+logger = logging.getLogger('voice_assistant')
+
+class MFCC:
+    """Streaming MFCC extractor, 25 ms frames every 10 ms
+
+    Leftover samples are kept between calls so blocks of any size can be fed.
+    """
+
+    def __init__(self, sample_rate=16000, n_mels=26, n_mfcc=13, frame_ms=25, hop_ms=10):
+        self.sample_rate = sample_rate
+        self.frame_length = int(sample_rate * frame_ms / 1000)
+        self.hop_length = int(sample_rate * hop_ms / 1000)
+        self.n_fft = 1 << (self.frame_length - 1).bit_length()
+        self.window = np.hamming(self.frame_length).astype(np.float32)
+        self.filterbank = self._mel_filterbank(n_mels)
+
+        # DCT-II basis, the first coefficient (overall level) is dropped so
+        # matching does not depend on how loud the phrase was spoken
+        n = np.arange(n_mels)
+        k = np.arange(1, n_mfcc)[:, None]
+        self.dct = np.cos(np.pi * k * (2 * n + 1) / (2 * n_mels)).astype(np.float32)
+
+        self._buffer = np.zeros(0, dtype=np.float32)
+
+    def _mel_filterbank(self, n_mels):
+        """Triangular filters spaced evenly on the mel scale"""
+        def to_mel(hz):
+            return 2595 * np.log10(1 + hz / 700)
+
+        def to_hz(mel):
+            return 700 * (10 ** (mel / 2595) - 1)
+
+        bins = np.floor(
+            (self.n_fft + 1) * to_hz(np.linspace(to_mel(0), to_mel(self.sample_rate / 2), n_mels + 2)) / self.sample_rate
+        ).astype(int)
+
+        filterbank = np.zeros((n_mels, self.n_fft // 2 + 1), dtype=np.float32)
+        for m in range(1, n_mels + 1):
+            left, center, right = bins[m - 1], bins[m], bins[m + 1]
+            if center > left:
+                filterbank[m - 1, left:center] = (np.arange(left, center) - left) / (center - left)
+            if right > center:
+                filterbank[m - 1, center:right] = (right - np.arange(center, right)) / (right - center)
+        return filterbank
+
+    def reset(self):
+        self._buffer = np.zeros(0, dtype=np.float32)
+
+    def process(self, block):
+        """Return (features, energies_db) for the complete frames available"""
+        buffer = np.concatenate((self._buffer, np.asarray(block, dtype=np.float32)))
+        if len(buffer) < self.frame_length:
+            self._buffer = buffer
+            return np.zeros((0, len(self.dct)), dtype=np.float32), np.zeros(0, dtype=np.float32)
+
+        count = 1 + (len(buffer) - self.frame_length) // self.hop_length
+        frames = np.lib.stride_tricks.sliding_window_view(buffer, self.frame_length)[::self.hop_length][:count]
+        self._buffer = buffer[count * self.hop_length:]
+
+        energies_db = 10 * np.log10(np.mean(frames ** 2, axis=1) + 1e-10)
+        power = np.abs(np.fft.rfft(frames * self.window, self.n_fft)) ** 2
+        features = np.log(power @ self.filterbank.T + 1e-10) @ self.dct.T
+        return features.astype(np.float32), energies_db.astype(np.float32)
+
+    def features(self, audio):
+        """Features for a whole clip, e.g. a wake phrase template"""
+        self.reset()
+        features, energies_db = self.process(audio)
+        self.reset()
+        return features, energies_db
+
+class EnergyVAD:
+    """Energy voice activity detector with an adaptive noise floor"""
+
+    def __init__(self, margin_db=12, min_speech_db=-55):
+        self.margin_db = margin_db
+        self.min_speech_db = min_speech_db
+        self.noise_floor = None
+
+    def reset(self):
+        self.noise_floor = None
+
+    def update(self, energy_db):
+        """Feed one frame's energy, returns whether it looks like speech"""
+        if self.noise_floor is None:
+            self.noise_floor = energy_db
+
+        speech = energy_db > max(self.noise_floor + self.margin_db, self.min_speech_db)
+
+        # Follow the floor down quickly and up slowly, never during speech
+        if energy_db < self.noise_floor:
+            self.noise_floor += 0.2 * (energy_db - self.noise_floor)
+        elif not speech:
+            self.noise_floor += 0.01 * (energy_db - self.noise_floor)
+        return speech
+
+def dtw_distance(template, window, end_frames=1):
+    """Length-normalised DTW distance of template against the end of window
+
+    The match may start anywhere in the window but has to end within its
+    last end_frames frames. Each template frame advances the window by 0-2
+    frames, so every row is a single vectorised numpy step.
+    """
+    cost = np.sqrt(((template[:, None, :] - window[None, :, :]) ** 2).sum(axis=2))
+    accumulated = cost[0].copy()
+    for row in cost[1:]:
+        previous = accumulated
+        best = previous.copy()
+        best[1:] = np.minimum(best[1:], previous[:-1])
+        best[2:] = np.minimum(best[2:], previous[:-2])
+        accumulated = row + best
+    return float(accumulated[-end_frames:].min()) / len(template)
+
+def _normalise(features, voiced=None):
+    """Cepstral mean normalisation, removes the channel/microphone colouring
+
+    The mean is taken over voiced frames only, so the amount of background
+    around the phrase does not shift it.
+    """
+    if voiced is not None and voiced.any():
+        return features - features[voiced].mean(axis=0)
+    return features - features.mean(axis=0)
+
+class WakeWordSpotter:
+    """Detects an enrolled wake phrase by template matching MFCC frames
+
+    Frames are only compared against the templates while the VAD has heard
+    speech recently, so silence costs little more than the MFCC front end.
+    """
+
+    def __init__(self, templates, threshold, sample_rate=16000, vad_margin_db=12, eval_ms=100):
+        self.mfcc = MFCC(sample_rate)
+        self.vad = EnergyVAD(vad_margin_db)
+        self.threshold = threshold
+        self.templates = [self._template(audio) for audio in templates]
+        self.templates = [template for template in self.templates if len(template) > 1]
+        if not self.templates:
+            raise ValueError("No usable wake phrase templates")
+
+        # Enough history for the longest template spoken at half speed
+        history_length = 2 * max(len(template) for template in self.templates)
+        self.history = deque(maxlen=history_length)
+        self.voiced = deque(maxlen=history_length)
+        self.eval_frames = max(1, eval_ms // 10)
+        self.speech_hold = 100  # frames a burst of speech keeps matching enabled
+        self._since_eval = 0
+        self._since_speech = self.speech_hold
+        self.last_distance = None
+
+    def _template(self, audio):
+        """Template features for a clip, without the silence around the phrase"""
+        features, energies_db = self.mfcc.features(audio)
+        voiced = np.flatnonzero(energies_db > energies_db.max() - 30) if len(energies_db) else []
+        if len(voiced):
+            features = features[voiced[0]:voiced[-1] + 1]
+        return _normalise(features)
+
+    @classmethod
+    def from_files(cls, paths, threshold, sample_rate=16000, vad_margin_db=12):
+        """Build a spotter from recorded wake phrase clips"""
+        templates = [FileSource(path, sample_rate).audio for path in paths]
+        return cls(templates, threshold, sample_rate, vad_margin_db)
+
+    def reset(self):
+        """Forget buffered audio, e.g. after a detection"""
+        self.mfcc.reset()
+        self.history.clear()
+        self.voiced.clear()
+        self._since_eval = 0
+        self._since_speech = self.speech_hold
+
+    def process(self, block):
+        """Feed an audio block, returns True when the wake phrase just ended"""
+        features, energies_db = self.mfcc.process(block)
+        for energy_db in energies_db:
+            speech = self.vad.update(energy_db)
+            self._since_speech = 0 if speech else self._since_speech + 1
+            self.voiced.append(speech)
+        self.history.extend(features)
+        self._since_eval += len(features)
+
+        if self._since_eval < self.eval_frames:
+            return False
+        end_frames, self._since_eval = self._since_eval, 0
+
+        # Nothing to match while it is quiet, or before enough audio is buffered
+        min_length = min(len(template) for template in self.templates) // 2
+        if self._since_speech >= self.speech_hold or len(self.history) < min_length:
+            return False
+
+        window = _normalise(np.array(self.history), np.array(self.voiced))
+        self.last_distance = min(
+            dtw_distance(template, window, min(end_frames, len(window)))
+            for template in self.templates
+        )
+        if self.last_distance < self.threshold:
+            logger.info(f"Wake phrase detected (distance {self.last_distance:.2f})")
+            self.reset()
+            return True
+        return False
+
+class HandsFreeController:
+    """Starts dictation on the wake phrase and stops it at the end of the utterance
+
+    Blocks arrive from the continuous capture callback and are handed to a
+    worker thread, so the audio callback itself stays cheap.
+    """
+
+    def __init__(self, config, recorder, start_callback, stop_callback):
+        self.config = config
+        self.recorder = recorder
+        self.start_callback = start_callback
+        self.stop_callback = stop_callback
+        self.sample_rate = recorder.sample_rate
+        self.spotter = None
+        self.mfcc = MFCC(self.sample_rate)
+        self.state = "listening"
+        self.elapsed = 0
+        self.silence = 0
+        self.heard_speech = False
+        self.blocks = queue.Queue(maxsize=200)
+        self.rebuild_pending = False
+
+        self._load_spotter()
+        config.subscribe(
+            self._on_config_changed,
+            keys=["handsfree_enabled", "wake_templates", "wake_threshold", "wake_vad_margin_db"]
+        )
+
+        self.thread = threading.Thread(target=self._run)
+        self.thread.daemon = True
+        self.thread.start()
+        recorder.add_block_listener(self._on_block)
+
+    def _load_spotter(self):
+        """Build the spotter from the configured templates"""
+        self.spotter = None
+        if not self.config.get("handsfree_enabled"):
+            return
+        try:
+            self.spotter = WakeWordSpotter.from_files(
+                self.config.get("wake_templates"),
+                self.config.get("wake_threshold"),
+                self.sample_rate,
+                self.config.get("wake_vad_margin_db")
+            )
+            logger.info("Hands-free mode listening for the wake phrase")
+        except Exception as e:
+            logger.error(f"Error loading wake phrase templates: {e}")
+
+    def _on_config_changed(self, changes):
+        # Rebuilt on the worker thread, between blocks
+        self.rebuild_pending = True
+
+    def _on_block(self, block):
+        """Capture callback, never blocks"""
+        try:
+            self.blocks.put_nowait(block)
+        except queue.Full:
+            pass
+
+    def _run(self):
+        while True:
+            block = self.blocks.get()
+            if self.rebuild_pending:
+                self.rebuild_pending = False
+                self.sample_rate = self.recorder.sample_rate
+                self.mfcc = MFCC(self.sample_rate)
+                self._load_spotter()
+            if self.spotter is None:
+                continue
+            try:
+                self._process(block)
+            except Exception as e:
+                logger.error(f"Error in hands-free listener: {e}")
+
+    def _process(self, block):
+        if self.state == "listening":
+            # A manual recording is in progress, leave it alone
+            if self.recorder.recording:
+                return
+            if self.spotter.process(block):
+                self.state = "dictating"
+                self.elapsed = 0
+                self.silence = 0
+                self.heard_speech = False
+                self.mfcc.reset()
+                # The wake phrase is not part of the dictation
+                self.start_callback(preroll=False)
+            return
+
+        # Dictating, stop once the speaker has been quiet long enough. The
+        # spotter's VAD keeps the noise floor learned while listening.
+        self.elapsed += len(block) / self.sample_rate
+        _, energies_db = self.mfcc.process(block)
+        for energy_db in energies_db:
+            if self.spotter.vad.update(energy_db):
+                # The tail of the wake phrase itself does not count
+                self.heard_speech = self.heard_speech or self.elapsed > 0.3
+                self.silence = 0
+            else:
+                self.silence += 10
+
+        silence_ms = self.config.get("handsfree_silence_ms")
+        finished = self.silence >= (silence_ms if self.heard_speech else max(5000, 4 * silence_ms))
+        if finished or self.elapsed >= self.config.get("handsfree_max_seconds"):
+            logger.info(f"Hands-free dictation ended after {self.elapsed:.1f}s")
+            self.stop_callback()
+            self._listen()
+        elif self.elapsed > 2 and not self.recorder.recording:
+            # Stopped manually
+            self._listen()
+
+    def _listen(self):
+        self.state = "listening"
+        self.spotter.reset()
+
+def benchmark(config, fixtures, block_ms=32):
+    """Measure spotter CPU use and detection latency on recorded fixtures
+
+    Each fixture may have a <name>.json sidecar with {"wake_ends": [seconds]},
+    the times the wake phrase ends, used to compute detection latency.
+    Returns a list of per-fixture result dicts.
+    """
+    sample_rate = config.get("sample_rate")
+    spotter = WakeWordSpotter.from_files(
+        config.get("wake_templates"),
+        config.get("wake_threshold"),
+        sample_rate,
+        config.get("wake_vad_margin_db")
+    )
+    block_size = int(sample_rate * block_ms / 1000)
+
+    results = []
+    for path in fixtures:
+        audio = FileSource(path, sample_rate).audio
+        spotter.reset()
+        spotter.vad.reset()
+        # reset() keeps it so a detection's distance can still be read, but not across fixtures
+        spotter.last_distance = None
+
+        detections = []
+        closest = None
+        started = time.process_time()
+        for start in range(0, len(audio), block_size):
+            block = audio[start:start + block_size]
+            if spotter.process(block):
+                detections.append((start + len(block)) / sample_rate)
+            if spotter.last_distance is not None:
+                closest = spotter.last_distance if closest is None else min(closest, spotter.last_distance)
+        cpu_seconds = time.process_time() - started
+
+        wake_ends = []
+        sidecar = os.path.splitext(path)[0] + ".json"
+        if os.path.exists(sidecar):
+            with open(sidecar, 'r') as f:
+                wake_ends = json.load(f).get("wake_ends", [])
+
+        # Match each labelled wake phrase to the nearest detection, a fading
+        # phrase end can be detected slightly before the label
+        latencies = []
+        for wake_end in wake_ends:
+            nearby = [d - wake_end for d in detections if -0.5 <= d - wake_end <= 2.0]
+            if nearby:
+                latencies.append(min(nearby, key=abs))
+
+        duration = len(audio) / sample_rate
+        results.append({
+            "fixture": path,
+            "duration": duration,
+            "cpu_load": cpu_seconds / duration if duration else 0.0,
+            "detections": detections,
+            "closest_distance": closest,
+            "expected": len(wake_ends),
+            "latencies": latencies
+        })
+    return results